@@ -10,7 +10,7 @@ from .data_preparation import DataPreparation
 from .vector_store import VectorStore
 from .query_processor import QueryProcessor
 from .retriever import Retriever
-from .prompts import FitnessPrompts
+from .prompts import FitnessPrompts, get_fitness_prompts
 from .generator import ResponseGenerator
 from .chat_interface import ChatInterface, Message, Conversation
 from .web_interface import WebInterface
@@ -26,6 +26,7 @@ __all__ = [
     "QueryProcessor", 
     "Retriever",
     "FitnessPrompts",
+    "get_fitness_prompts",
     "ResponseGenerator",
     "ChatInterface",
     "Message",
@@ -8,7 +8,7 @@ from typing import List, Dict, Any, Optional, Tuple
 from datetime import datetime
 import json
 from config.environment import env_config
-from .prompts import FitnessPrompts
+from .prompts import get_fitness_prompts
 from .utils.formatting import ResponseFormatter
 from .analytics import FitnessAnalytics
 from .utils.calculations import FitnessCalculations
@@ -31,7 +31,7 @@ class ResponseGenerator:
         """
         self.llm_provider = llm_provider or os.getenv("LLM_PROVIDER", "openai")
         self.llm_model = llm_model or os.getenv("LLM_MODEL", "gpt-4o-mini")
-        self.prompts = FitnessPrompts()
+        self.prompts = get_fitness_prompts()
         self.formatter = ResponseFormatter()
         self.llm_client = None
         
@@ -266,19 +266,8 @@ class ResponseGenerator:
         Returns:
             Query type
         """
-        query_lower = query.lower()
-        
-        # Simple classification based on keywords
-        if any(word in query_lower for word in ["trend", "changed", "progress", "improved", "decreased", "increased"]):
-            return "trend"
-        elif any(word in query_lower for word in ["compare", "difference", "vs", "versus", "between"]):
-            return "comparison"
-        elif any(word in query_lower for word in ["summary", "overview", "journey", "overall"]):
-            return "summary"
-        elif any(word in query_lower for word in ["goal", "target", "achieving", "progress toward"]):
-            return "goal"
-        else:
-            return "specific"
+        # Keyword classification shared with the prompt templates
+        return self.prompts.classify_query(query)
     
     def _format_response(self, response_text: str, query: str, context: List[Dict[str, Any]], 
                         query_type: str) -> str:
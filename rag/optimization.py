@@ -5,24 +5,36 @@ Performance optimization, batch processing, and load balancing
 
 import time
 import threading
-import queue
-from typing import List, Dict, Any, Optional, Callable, Tuple
+import itertools
+import heapq
+import weakref
+from collections import deque
+from typing import List, Dict, Any, Optional, Callable, Tuple, Iterator
 from datetime import datetime, timedelta
 from dataclasses import dataclass
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor, Future
 import numpy as np
 from .vector_store import VectorStore
 from .cache import CacheManager
 
 
+# Thread pool shared by batch processors unless one is passed in
+_SHARED_EXECUTOR = ThreadPoolExecutor(thread_name_prefix="rag")
+
+
 @dataclass
 class PerformanceMetrics:
     """Represents performance metrics"""
     operation: str
     duration_ms: float
-    timestamp: datetime
+    timestamp_ns: int  # Wall-clock time in nanoseconds since the epoch
     success: bool
     metadata: Dict[str, Any] = None
+    
+    @property
+    def timestamp(self) -> datetime:
+        """Metric timestamp as a datetime"""
+        return datetime.fromtimestamp(self.timestamp_ns / 1e9)
 
 
 @dataclass
@@ -36,21 +48,54 @@ class BatchJob:
     status: str  # 'pending', 'processing', 'completed', 'failed'
     results: List[Any] = None
     errors: List[str] = None
+    futures: List[Future] = None
+    chunks: List[List[Any]] = None
+    sequence: int = 0  # Submission order, breaking ties between equal created_at times
+    next_chunk: int = 0  # Index of the first chunk not yet submitted
+    running_chunks: int = 0
 
 
 class PerformanceMonitor:
     """Monitors and tracks performance metrics"""
     
-    def __init__(self, max_metrics: int = 10000):
+    def __init__(self, max_metrics: int = 10000, buffer_size: int = 64,
+                 flush_interval: float = 1.0):
         """
         Initialize performance monitor
         
         Args:
             max_metrics: Maximum number of metrics to store
+            buffer_size: Metrics buffered per thread before flushing to shared storage
+            flush_interval: Seconds a metric may stay buffered before being flushed
         """
         self.max_metrics = max_metrics
-        self.metrics: List[PerformanceMetrics] = []
+        self.buffer_size = buffer_size
+        self.flush_interval_ns = int(flush_interval * 1e9)
+        self.metrics: deque = deque(maxlen=max_metrics)
         self.lock = threading.Lock()
+        
+        # Per-thread write buffers with their owning thread, registered so readers can drain them
+        self._local = threading.local()
+        self._buffers: List[Tuple[weakref.ref, List[PerformanceMetrics]]] = []
+    
+    def _get_buffer(self) -> List[PerformanceMetrics]:
+        """Get the calling thread's metric buffer"""
+        buffer = getattr(self._local, 'buffer', None)
+        if buffer is None:
+            buffer = self._local.buffer = []
+            with self.lock:
+                # Draining prunes buffers of finished threads, so the registry tracks live threads only
+                self._drain_all()
+                self._buffers.append((weakref.ref(threading.current_thread()), buffer))
+        return buffer
+    
+    def _drain(self, buffer: List[PerformanceMetrics]):
+        """Move buffered metrics into shared storage (lock held)"""
+        # Copy then delete the same prefix, so concurrent appends by the owning thread are kept
+        pending = buffer[:]
+        del buffer[:len(pending)]
+        # Bounded deque evicts the oldest metric on overflow
+        self.metrics.extend(pending)
     
     def record_metric(self, operation: str, duration_ms: float, success: bool, 
                      metadata: Dict[str, Any] = None):
@@ -67,21 +112,53 @@ class PerformanceMonitor:
             metric = PerformanceMetrics(
                 operation=operation,
                 duration_ms=duration_ms,
-                timestamp=datetime.now(),
+                timestamp_ns=time.time_ns(),
                 success=success,
                 metadata=metadata or {}
             )
             
-            with self.lock:
-                self.metrics.append(metric)
-                
-                # Remove old metrics if exceeding max
-                if len(self.metrics) > self.max_metrics:
-                    self.metrics = self.metrics[-self.max_metrics:]
+            # Buffer locally and only take the lock once per buffer_size metrics
+            buffer = self._get_buffer()
+            buffer.append(metric)
+            if (len(buffer) >= self.buffer_size or
+                    metric.timestamp_ns - buffer[0].timestamp_ns >= self.flush_interval_ns):
+                with self.lock:
+                    self._drain(buffer)
                     
         except Exception as e:
             print(f"❌ Error recording metric: {e}")
     
+    def flush(self):
+        """Flush all per-thread metric buffers to shared storage"""
+        with self.lock:
+            self._drain_all()
+    
+    def _drain_all(self):
+        """Drain every registered buffer into shared storage, dropping those of finished threads (lock held)"""
+        live_buffers = []
+        for owner, buffer in self._buffers:
+            self._drain(buffer)
+            thread = owner()
+            # A finished thread can no longer append, so its drained buffer stays empty
+            if thread is not None and thread.is_alive():
+                live_buffers.append((owner, buffer))
+        self._buffers = live_buffers
+    
+    def _matching(self, operation: str = None, time_window: timedelta = None) -> Iterator[PerformanceMetrics]:
+        """Iterate stored metrics matching the filters (lock held while consuming)"""
+        metrics = iter(self.metrics)
+        
+        # Filter by operation
+        if operation:
+            metrics = (m for m in metrics if m.operation == operation)
+        
+        # Filter by time window
+        if time_window:
+            cutoff_ns = time.time_ns() - int(time_window.total_seconds() * 1e9)
+            metrics = (m for m in metrics if m.timestamp_ns > cutoff_ns)
+        
+        return metrics
+    
     def get_metrics(self, operation: str = None, time_window: timedelta = None) -> List[PerformanceMetrics]:
         """
         Get performance metrics
@@ -94,19 +171,10 @@ class PerformanceMonitor:
             List of performance metrics
         """
         try:
+            # Filter while copying, so only matching metrics are copied
             with self.lock:
-                metrics = self.metrics.copy()
-            
-            # Filter by operation
-            if operation:
-                metrics = [m for m in metrics if m.operation == operation]
-            
-            # Filter by time window
-            if time_window:
-                cutoff_time = datetime.now() - time_window
-                metrics = [m for m in metrics if m.timestamp > cutoff_time]
-            
-            return metrics
+                self._drain_all()
+                return list(self._matching(operation, time_window))
             
         except Exception as e:
             print(f"❌ Error getting metrics: {e}")
@@ -124,25 +192,33 @@ class PerformanceMonitor:
             Performance statistics
         """
         try:
-            metrics = self.get_metrics(operation, time_window)
+            # Read durations and outcomes straight into one compact array, without
+            # materializing an intermediate list of metrics
+            with self.lock:
+                self._drain_all()
+                samples = np.fromiter(
+                    ((m.duration_ms, m.success) for m in self._matching(operation, time_window)),
+                    dtype=[('duration_ms', np.float64), ('success', np.bool_)]
+                )
             
-            if not metrics:
+            if not len(samples):
                 return {"error": "No metrics available"}
             
-            durations = [m.duration_ms for m in metrics]
-            success_count = sum(1 for m in metrics if m.success)
-            
+            durations = samples['duration_ms']
+            p50, p95, p99 = np.percentile(durations, [50, 95, 99])
+            success_count = int(samples['success'].sum())
+
             stats = {
-                "total_operations": len(metrics),
+                "total_operations": len(samples),
                 "successful_operations": success_count,
-                "success_rate": round((success_count / len(metrics)) * 100, 2),
-                "average_duration_ms": round(np.mean(durations), 2),
-                "median_duration_ms": round(np.median(durations), 2),
-                "min_duration_ms": round(min(durations), 2),
-                "max_duration_ms": round(max(durations), 2),
-                "std_duration_ms": round(np.std(durations), 2),
-                "p95_duration_ms": round(np.percentile(durations, 95), 2),
-                "p99_duration_ms": round(np.percentile(durations, 99), 2)
+                "success_rate": round((success_count / len(samples)) * 100, 2),
+                "average_duration_ms": round(float(durations.mean()), 2),
+                "median_duration_ms": round(float(p50), 2),
+                "min_duration_ms": round(float(durations.min()), 2),
+                "max_duration_ms": round(float(durations.max()), 2),
+                "std_duration_ms": round(float(durations.std()), 2),
+                "p95_duration_ms": round(float(p95), 2),
+                "p99_duration_ms": round(float(p99), 2)
             }
             
             return stats
@@ -154,32 +230,45 @@ class PerformanceMonitor:
     def clear_metrics(self):
         """Clear all metrics"""
         with self.lock:
+            for _, buffer in self._buffers:
+                del buffer[:]
             self.metrics.clear()
 
 
 class BatchProcessor:
     """Handles batch processing of operations"""
     
-    def __init__(self, max_workers: int = 4, max_queue_size: int = 100):
+    NUM_SHARDS = 16
+    CHUNKS_PER_WORKER = 4
+    ACTIVE_STATUSES = ('pending', 'processing')
+    FINISHED_STATUSES = ('completed', 'failed')
+    
+    def __init__(self, max_workers: int = 4, max_queue_size: int = 100,
+                 executor: ThreadPoolExecutor = None, max_completed_jobs: int = 1000):
         """
         Initialize batch processor
         
         Args:
-            max_workers: Maximum number of worker threads
+            max_workers: Maximum number of chunks run at once across all jobs
             max_queue_size: Maximum queue size
+            executor: Thread pool to run chunks on (defaults to the shared pool)
+            max_completed_jobs: Maximum number of finished jobs to retain
         """
         self.max_workers = max_workers
         self.max_queue_size = max_queue_size
-        self.job_queue = queue.Queue(maxsize=max_queue_size)
-        self.active_jobs: Dict[str, BatchJob] = {}
-        self.completed_jobs: Dict[str, BatchJob] = {}
-        self.lock = threading.Lock()
-        self.executor = ThreadPoolExecutor(max_workers=max_workers)
-        self.running = True
-        
-        # Start worker thread
-        self.worker_thread = threading.Thread(target=self._worker_loop, daemon=True)
-        self.worker_thread.start()
+        self.max_completed_jobs = max_completed_jobs
+        # Job table is sharded by job ID, each shard guarded by its own lock and
+        # holding a min-heap of (created_at timestamp, sequence, job ID) for finished jobs
+        self._shards: List[Tuple[Dict[str, BatchJob], List[Tuple[float, int, str]], threading.Lock]] = [
+            ({}, [], threading.Lock()) for _ in range(self.NUM_SHARDS)
+        ]
+        self.executor = executor or _SHARED_EXECUTOR
+        self.job_counter = itertools.count()
+        # Jobs with chunks not yet submitted, fed to the executor as workers free up,
+        # so max_workers bounds concurrency even on the shared pool
+        self._waiting_jobs: deque = deque()
+        self._running_chunks = 0
+        self._dispatch_lock = threading.Lock()
     
     def submit_batch(self, items: List[Any], processor: Callable, 
                     max_workers: int = None) -> str:
@@ -195,7 +284,9 @@ class BatchProcessor:
             Job ID
         """
         try:
-            job_id = f"batch_{int(time.time() * 1000)}"
+            # itertools.count is atomic under the GIL, so IDs never collide
+            sequence = next(self.job_counter)
+            job_id = f"batch_{sequence}"
             max_workers = max_workers or self.max_workers
             
             job = BatchJob(
@@ -204,16 +295,28 @@ class BatchProcessor:
                 processor=processor,
                 max_workers=max_workers,
                 created_at=datetime.now(),
-                status='pending',
+                status='processing',
                 results=[],
-                errors=[]
+                errors=[],
+                sequence=sequence
             )
             
-            with self.lock:
-                self.active_jobs[job_id] = job
+            # Split items into several chunks per worker so idle workers pick up
+            # leftover chunks instead of waiting on a single slow one
+            chunk_size = max(1, len(items) // (max_workers * self.CHUNKS_PER_WORKER))
+            job.chunks = [items[i:i + chunk_size] for i in range(0, len(items), chunk_size)]
+            job.futures = [None] * len(job.chunks)
+            
+            jobs, age_heap, lock = self._shard(job_id)
+            with lock:
+                jobs[job_id] = job
+                if not job.chunks:
+                    self._collect_job(job, jobs, age_heap)
             
-            # Add to queue
-            self.job_queue.put(job)
+            if job.chunks:
+                with self._dispatch_lock:
+                    self._waiting_jobs.append(job)
+                self._dispatch_chunks()
             
             return job_id
             
@@ -221,69 +324,114 @@ class BatchProcessor:
             print(f"❌ Error submitting batch job: {e}")
             return None
     
-    def _worker_loop(self):
-        """Main worker loop"""
-        while self.running:
-            try:
-                # Get job from queue
-                job = self.job_queue.get(timeout=1)
-                
-                # Process job
-                self._process_job(job)
+    def _shard(self, job_id: str) -> Tuple[Dict[str, BatchJob], List[Tuple[float, int, str]], threading.Lock]:
+        """Get the (jobs, age heap, lock) shard owning a job ID"""
+        return self._shards[hash(job_id) % self.NUM_SHARDS]
+    
+    def _jobs_with_status(self, statuses: Tuple[str, ...]) -> Dict[str, BatchJob]:
+        """Snapshot of jobs in the given statuses across all shards"""
+        snapshot = {}
+        for jobs, _, lock in self._shards:
+            with lock:
+                for job in jobs.values():
+                    if job.status in statuses:
+                        snapshot[job.id] = job
+        return snapshot
+    
+    @property
+    def active_jobs(self) -> Dict[str, BatchJob]:
+        """Snapshot of active jobs across all shards"""
+        return self._jobs_with_status(self.ACTIVE_STATUSES)
+    
+    @property
+    def completed_jobs(self) -> Dict[str, BatchJob]:
+        """Snapshot of completed jobs across all shards"""
+        return self._jobs_with_status(self.FINISHED_STATUSES)
+    
+    def _dispatch_chunks(self):
+        """Submit waiting chunks while the processor and their jobs have free workers"""
+        to_submit = []
+        with self._dispatch_lock:
+            for job in list(self._waiting_jobs):
+                if self._running_chunks >= self.max_workers:
+                    break
                 
-                # Mark as done
-                self.job_queue.task_done()
+                while (self._running_chunks < self.max_workers
+                       and job.running_chunks < job.max_workers
+                       and job.next_chunk < len(job.chunks)):
+                    to_submit.append((job, job.next_chunk))
+                    job.next_chunk += 1
+                    job.running_chunks += 1
+                    self._running_chunks += 1
                 
-            except queue.Empty:
-                continue
+                if job.next_chunk == len(job.chunks):
+                    self._waiting_jobs.remove(job)
+        
+        # Submit outside the lock: a chunk that finishes at once runs its callback here
+        for job, index in to_submit:
+            future = self.executor.submit(self._process_chunk, job.processor, job.chunks[index])
+            job.futures[index] = future
+            future.add_done_callback(lambda _, job=job: self._on_chunk_done(job))
+    
+    def _on_chunk_done(self, job: BatchJob):
+        """Future callback run when one of a job's chunks finishes"""
+        with self._dispatch_lock:
+            job.running_chunks -= 1
+            self._running_chunks -= 1
+        
+        # Collect the job as soon as its last chunk finishes
+        jobs, age_heap, lock = self._shard(job.id)
+        with lock:
+            self._collect_job(job, jobs, age_heap)
+        
+        self._dispatch_chunks()
+    
+    def _collect_job(self, job: BatchJob, jobs: Dict[str, BatchJob],
+                     age_heap: List[Tuple[float, int, str]]) -> None:
+        """Collect results of a job whose chunks have all finished (shard lock held)"""
+        if job.status != 'processing' or not all(
+            future is not None and future.done() for future in job.futures
+        ):
+            return
+        
+        # Collect results in submission order
+        results = []
+        errors = []
+        
+        for future in job.futures:
+            try:
+                chunk_results, chunk_errors = future.result()
+                results.extend(chunk_results)
+                errors.extend(chunk_errors)
             except Exception as e:
-                print(f"❌ Error in worker loop: {e}")
+                errors.append(str(e))
+        
+        # Update job
+        job.results = results
+        job.errors = errors
+        job.futures = None
+        job.chunks = None
+        job.status = 'completed' if not errors else 'failed'
+        
+        # Track finished jobs by age, evicting the oldest beyond the retention cap
+        heapq.heappush(age_heap, (job.created_at.timestamp(), job.sequence, job.id))
+        while len(age_heap) > max(1, self.max_completed_jobs // self.NUM_SHARDS):
+            _, _, old_job_id = heapq.heappop(age_heap)
+            jobs.pop(old_job_id, None)
     
-    def _process_job(self, job: BatchJob):
-        """Process a batch job"""
-        try:
-            job.status = 'processing'
-            
-            # Split items into chunks
-            chunk_size = max(1, len(job.items) // job.max_workers)
-            chunks = [job.items[i:i + chunk_size] for i in range(0, len(job.items), chunk_size)]
-            
-            # Process chunks in parallel
-            futures = []
-            for chunk in chunks:
-                future = self.executor.submit(self._process_chunk, job.processor, chunk)
-                futures.append(future)
-            
-            # Collect results
-            results = []
-            errors = []
-            
-            for future in as_completed(futures):
-                try:
-                    chunk_results = future.result()
-                    results.extend(chunk_results)
-                except Exception as e:
-                    errors.append(str(e))
-            
-            # Update job
-            job.results = results
-            job.errors = errors
-            job.status = 'completed' if not errors else 'failed'
-            
-            # Move to completed jobs
-            with self.lock:
-                if job.id in self.active_jobs:
-                    del self.active_jobs[job.id]
-                self.completed_jobs[job.id] = job
+    def _process_chunk(self, processor: Callable, items: List[Any]) -> Tuple[List[Any], List[str]]:
+        """
+        Process a chunk of items, running each item exactly once
+        
+        Args:
+            processor: Processing function
+            items: Items to process
             
-        except Exception as e:
-            job.status = 'failed'
-            job.errors = [str(e)]
-            print(f"❌ Error processing batch job: {e}")
-    
-    def _process_chunk(self, processor: Callable, items: List[Any]) -> List[Any]:
-        """Process a chunk of items"""
+        Returns:
+            Tuple of (results in item order, None for failed items; error messages)
+        """
         results = []
+        errors = []
         for item in items:
             try:
                 result = processor(item)
@@ -291,7 +439,8 @@ class BatchProcessor:
             except Exception as e:
                 print(f"❌ Error processing item: {e}")
                 results.append(None)
-        return results
+                errors.append(str(e))
+        return results, errors
     
     def get_job_status(self, job_id: str) -> Optional[Dict[str, Any]]:
         """
@@ -304,13 +453,10 @@ class BatchProcessor:
             Job status information
         """
         try:
-            with self.lock:
-                # Check active jobs
-                if job_id in self.active_jobs:
-                    job = self.active_jobs[job_id]
-                elif job_id in self.completed_jobs:
-                    job = self.completed_jobs[job_id]
-                else:
+            jobs, _, lock = self._shard(job_id)
+            with lock:
+                job = jobs.get(job_id)
+                if job is None:
                     return None
             
             return {
@@ -338,9 +484,13 @@ class BatchProcessor:
             Job results
         """
         try:
-            with self.lock:
-                if job_id in self.completed_jobs:
-                    return self.completed_jobs[job_id].results
+            jobs, _, lock = self._shard(job_id)
+            with lock:
+                job = jobs.get(job_id)
+                if job is None:
+                    return None
+                if job.status in self.FINISHED_STATUSES:
+                    return job.results
                 return None
                 
         except Exception as e:
@@ -355,16 +505,16 @@ class BatchProcessor:
             max_age_hours: Maximum age in hours
         """
         try:
-            cutoff_time = datetime.now() - timedelta(hours=max_age_hours)
+            cutoff_ts = (datetime.now() - timedelta(hours=max_age_hours)).timestamp()
             
-            with self.lock:
-                old_jobs = [
-                    job_id for job_id, job in self.completed_jobs.items()
-                    if job.created_at < cutoff_time
-                ]
-                
-                for job_id in old_jobs:
-                    del self.completed_jobs[job_id]
+            # Pop expired jobs off each shard's age heap; only old jobs are visited
+            old_jobs = []
+            for jobs, age_heap, lock in self._shards:
+                with lock:
+                    while age_heap and age_heap[0][0] < cutoff_ts:
+                        _, _, job_id = heapq.heappop(age_heap)
+                        if jobs.pop(job_id, None) is not None:
+                            old_jobs.append(job_id)
             
             if old_jobs:
                 print(f"✅ Cleaned up {len(old_jobs)} old jobs")
@@ -374,8 +524,9 @@ class BatchProcessor:
     
     def shutdown(self):
         """Shutdown the batch processor"""
-        self.running = False
-        self.executor.shutdown(wait=True)
+        # The shared pool outlives individual processors
+        if self.executor is not _SHARED_EXECUTOR:
+            self.executor.shutdown(wait=True)
 
 
 class VectorSearchOptimizer:
@@ -397,6 +548,9 @@ class VectorSearchOptimizer:
         self.batch_size = 10
         self.similarity_threshold = 0.7
         self.max_results = 20
+        self.vectorized_filter_threshold = 64  # Result count above which filtering uses NumPy
+        self.cache_hit_sample_every = 64  # Record one in every N cache-hit metrics
+        self.cache_hit_counter = itertools.count()
     
     def optimize_search(self, query: str, n_results: int = 5, 
                        filters: Dict = None) -> List[Dict]:
@@ -411,18 +565,20 @@ class VectorSearchOptimizer:
         Returns:
             Search results
         """
-        start_time = time.time()
+        start_ns = time.perf_counter_ns()
         
         try:
             # Check cache first
             if self.cache_manager:
                 cached_results = self.cache_manager.get_vector_results(query, n_results, filters)
                 if cached_results:
-                    duration = (time.time() - start_time) * 1000
-                    self.performance_monitor.record_metric(
-                        "vector_search_cache_hit", duration, True,
-                        {"query": query, "results_count": len(cached_results)}
-                    )
+                    # Only every Nth cache hit is recorded to keep the hit path cheap
+                    if next(self.cache_hit_counter) % self.cache_hit_sample_every == 0:
+                        duration = (time.perf_counter_ns() - start_ns) / 1e6
+                        self.performance_monitor.record_metric(
+                            "vector_search_cache_hit", duration, True,
+                            {"query": query, "results_count": len(cached_results)}
+                        )
                     return cached_results
             
             # Perform search
@@ -437,7 +593,7 @@ class VectorSearchOptimizer:
                 self.cache_manager.set_vector_results(query, n_results, filters, results)
             
             # Record metrics
-            duration = (time.time() - start_time) * 1000
+            duration = (time.perf_counter_ns() - start_ns) / 1e6
             self.performance_monitor.record_metric(
                 "vector_search", duration, True,
                 {"query": query, "results_count": len(results)}
@@ -446,7 +602,7 @@ class VectorSearchOptimizer:
             return results
             
         except Exception as e:
-            duration = (time.time() - start_time) * 1000
+            duration = (time.perf_counter_ns() - start_ns) / 1e6
             self.performance_monitor.record_metric(
                 "vector_search", duration, False,
                 {"query": query, "error": str(e)}
@@ -457,6 +613,9 @@ class VectorSearchOptimizer:
     def _apply_filters(self, results: List[Dict], filters: Dict) -> List[Dict]:
         """Apply filters to search results"""
         try:
+            if len(results) >= self.vectorized_filter_threshold:
+                return self._apply_filters_vectorized(results, filters)
+            
             filtered_results = []
             
             for result in results:
@@ -486,6 +645,29 @@ class VectorSearchOptimizer:
             print(f"❌ Error applying filters: {e}")
             return results
     
+    def _apply_filters_vectorized(self, results: List[Dict], filters: Dict) -> List[Dict]:
+        """Apply filters to a large result set using NumPy boolean masks"""
+        missing = object()
+        metadatas = [result.get('metadata', {}) for result in results]
+        mask = np.ones(len(results), dtype=bool)
+        
+        for key, value in filters.items():
+            # Object column of this metadata field, with a sentinel for missing keys
+            column = np.empty(len(results), dtype=object)
+            column[:] = [metadata.get(key, missing) for metadata in metadatas]
+            
+            if isinstance(value, (list, tuple)):
+                allowed = np.empty(len(value), dtype=object)
+                allowed[:] = list(value)
+                mask &= np.isin(column, allowed)
+            else:
+                mask &= column == value
+            
+            if not mask.any():
+                return []
+        
+        return [results[i] for i in np.flatnonzero(mask)]
+    
     def batch_search(self, queries: List[str], n_results: int = 5) -> List[List[Dict]]:
         """
         Perform batch search
@@ -497,33 +679,32 @@ class VectorSearchOptimizer:
         Returns:
             List of search results for each query
         """
-        start_time = time.time()
+        start_ns = time.perf_counter_ns()
         
         try:
+            # Search each distinct query only once
+            unique_queries = list(dict.fromkeys(queries))
+            unique_results = {}
+            
             # Process in batches
-            all_results = []
+            for i in range(0, len(unique_queries), self.batch_size):
+                for query in unique_queries[i:i + self.batch_size]:
+                    unique_results[query] = self.optimize_search(query, n_results)
             
-            for i in range(0, len(queries), self.batch_size):
-                batch_queries = queries[i:i + self.batch_size]
-                batch_results = []
-                
-                for query in batch_queries:
-                    results = self.optimize_search(query, n_results)
-                    batch_results.append(results)
-                
-                all_results.extend(batch_results)
+            all_results = [unique_results[query] for query in queries]
             
             # Record metrics
-            duration = (time.time() - start_time) * 1000
+            duration = (time.perf_counter_ns() - start_ns) / 1e6
             self.performance_monitor.record_metric(
                 "batch_vector_search", duration, True,
-                {"queries_count": len(queries), "batch_size": self.batch_size}
+                {"queries_count": len(queries), "unique_queries_count": len(unique_queries),
+                 "batch_size": self.batch_size}
             )
             
             return all_results
             
         except Exception as e:
-            duration = (time.time() - start_time) * 1000
+            duration = (time.perf_counter_ns() - start_ns) / 1e6
             self.performance_monitor.record_metric(
                 "batch_vector_search", duration, False,
                 {"queries_count": len(queries), "error": str(e)}
@@ -548,8 +729,9 @@ class LoadBalancer:
         """
         self.max_concurrent_requests = max_concurrent_requests
         self.active_requests = 0
-        self.request_queue = queue.Queue()
+        self.queued_requests = 0
         self.lock = threading.Lock()
+        self.semaphore = threading.Semaphore(max_concurrent_requests)
         self.performance_monitor = PerformanceMonitor()
     
     def submit_request(self, operation: Callable, *args, **kwargs) -> Any:
@@ -564,52 +746,44 @@ class LoadBalancer:
         Returns:
             Operation result
         """
-        start_time = time.time()
+        start_ns = time.perf_counter_ns()
         
         try:
-            # Check if we can process immediately
-            with self.lock:
-                if self.active_requests < self.max_concurrent_requests:
-                    self.active_requests += 1
-                    immediate = True
-                else:
-                    immediate = False
-            
-            if immediate:
+            # Check if we can process immediately, otherwise wait for a free slot
+            immediate = self.semaphore.acquire(blocking=False)
+            if not immediate:
+                with self.lock:
+                    self.queued_requests += 1
                 try:
-                    result = operation(*args, **kwargs)
-                    
-                    # Record metrics
-                    duration = (time.time() - start_time) * 1000
-                    self.performance_monitor.record_metric(
-                        "load_balanced_operation", duration, True,
-                        {"operation": operation.__name__, "immediate": True}
-                    )
-                    
-                    return result
-                    
+                    self.semaphore.acquire()
                 finally:
                     with self.lock:
-                        self.active_requests -= 1
-            else:
-                # Queue the request
-                future = queue.Queue()
-                self.request_queue.put((operation, args, kwargs, future))
-                
-                # Wait for result
-                result = future.get()
+                        self.queued_requests -= 1
+            
+            try:
+                with self.lock:
+                    self.active_requests += 1
                 
-                # Record metrics
-                duration = (time.time() - start_time) * 1000
-                self.performance_monitor.record_metric(
-                    "load_balanced_operation", duration, True,
-                    {"operation": operation.__name__, "immediate": False}
-                )
+                # Run on the caller's thread: it waits for the result anyway, and a
+                # pool shared with batch jobs could deadlock on nested submissions
+                result = operation(*args, **kwargs)
                 
-                return result
+            finally:
+                with self.lock:
+                    self.active_requests -= 1
+                self.semaphore.release()
+            
+            # Record metrics
+            duration = (time.perf_counter_ns() - start_ns) / 1e6
+            self.performance_monitor.record_metric(
+                "load_balanced_operation", duration, True,
+                {"operation": operation.__name__, "immediate": immediate}
+            )
+            
+            return result
                 
         except Exception as e:
-            duration = (time.time() - start_time) * 1000
+            duration = (time.perf_counter_ns() - start_ns) / 1e6
             self.performance_monitor.record_metric(
                 "load_balanced_operation", duration, False,
                 {"operation": operation.__name__, "error": str(e)}
@@ -617,35 +791,12 @@ class LoadBalancer:
             print(f"❌ Error in load balanced operation: {e}")
             raise
     
-    def _process_queued_requests(self):
-        """Process queued requests"""
-        while True:
-            try:
-                operation, args, kwargs, future = self.request_queue.get(timeout=1)
-                
-                with self.lock:
-                    self.active_requests += 1
-                
-                try:
-                    result = operation(*args, **kwargs)
-                    future.put(result)
-                except Exception as e:
-                    future.put(e)
-                finally:
-                    with self.lock:
-                        self.active_requests -= 1
-                        
-            except queue.Empty:
-                continue
-            except Exception as e:
-                print(f"❌ Error processing queued request: {e}")
-    
     def get_load_statistics(self) -> Dict[str, Any]:
         """Get load balancer statistics"""
         try:
-            with self.lock:
-                active = self.active_requests
-                queued = self.request_queue.qsize()
+            # Counters are only written under the lock; a slightly stale read is fine for stats
+            active = self.active_requests
+            queued = self.queued_requests
             
             return {
                 "active_requests": active,
@@ -656,6 +807,11 @@ class LoadBalancer:
         except Exception as e:
             print(f"❌ Error getting load statistics: {e}")
             return {"error": str(e)}
+    
+    def shutdown(self):
+        """Shutdown the load balancer"""
+        # Requests run on their callers' threads, so there is nothing to release
+        pass
 
 
 class RAGOptimizer:
@@ -683,12 +839,6 @@ class RAGOptimizer:
     
     def _start_background_processes(self):
         """Start background optimization processes"""
-        # Start load balancer worker
-        self.load_balancer_worker = threading.Thread(
-            target=self.load_balancer._process_queued_requests, daemon=True
-        )
-        self.load_balancer_worker.start()
-        
         # Start periodic cleanup
         self.cleanup_thread = threading.Thread(
             target=self._periodic_cleanup, daemon=True
@@ -726,14 +876,14 @@ class RAGOptimizer:
         Returns:
             Optimized response
         """
-        start_time = time.time()
+        start_ns = time.perf_counter_ns()
         
         try:
             # Check cache first
             if self.cache_manager:
                 cached_response = self.cache_manager.get_response(query, context, query_type)
                 if cached_response:
-                    duration = (time.time() - start_time) * 1000
+                    duration = (time.perf_counter_ns() - start_ns) / 1e6
                     self.performance_monitor.record_metric(
                         "query_cache_hit", duration, True,
                         {"query": query, "query_type": query_type}
@@ -758,7 +908,7 @@ class RAGOptimizer:
                 self.cache_manager.set_response(query, context, query_type, result)
             
             # Record metrics
-            duration = (time.time() - start_time) * 1000
+            duration = (time.perf_counter_ns() - start_ns) / 1e6
             self.performance_monitor.record_metric(
                 "optimized_query", duration, True,
                 {"query": query, "query_type": query_type}
@@ -767,7 +917,7 @@ class RAGOptimizer:
             return result
             
         except Exception as e:
-            duration = (time.time() - start_time) * 1000
+            duration = (time.perf_counter_ns() - start_ns) / 1e6
             self.performance_monitor.record_metric(
                 "optimized_query", duration, False,
                 {"query": query, "error": str(e)}
@@ -796,6 +946,7 @@ class RAGOptimizer:
         """Shutdown the optimizer"""
         try:
             self.batch_processor.shutdown()
+            self.load_balancer.shutdown()
             print("✅ RAG optimizer shutdown completed")
         except Exception as e:
             print(f"❌ Error shutting down optimizer: {e}") 
\ No newline at end of file
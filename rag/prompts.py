@@ -3,20 +3,17 @@ Prompts Module for RAG Pipeline
 Specialized prompt templates for fitness data queries
 """
 
-from typing import List, Dict, Any, Optional
+import heapq
+import re
+import threading
+from collections import OrderedDict, defaultdict
+from functools import lru_cache
+from string import Formatter
+from typing import List, Dict, Any, Optional, Tuple, Iterator
 
 
-class FitnessPrompts:
-    """Specialized prompts for fitness data analysis"""
-    
-    def __init__(self):
-        """Initialize fitness prompts"""
-        self.system_prompt = self._get_system_prompt()
-        self.query_prompts = self._get_query_prompts()
-    
-    def _get_system_prompt(self) -> str:
-        """Get the main system prompt"""
-        return """You are a fitness data assistant that provides concise, accurate answers about fitness measurements.
+# Prompt texts and templates are built once at import and shared by all instances
+_SYSTEM_PROMPT = """You are a fitness data assistant that provides concise, accurate answers about fitness measurements.
 
 **CRITICAL INSTRUCTIONS:**
 - Be CONCISE and TO THE POINT - no extra information unless specifically asked
@@ -57,11 +54,9 @@ Do NOT include:
 - Health implications unless asked  
 - Recommendations unless asked
 - Extra explanations unless asked"""
-    
-    def _get_query_prompts(self) -> Dict[str, str]:
-        """Get specialized prompts for different query types"""
-        return {
-            'trend': """Analyze the fitness data to identify trends and patterns. Focus on:
+
+_QUERY_PROMPTS = {
+    'trend': """Analyze the fitness data to identify trends and patterns. Focus on:
 
 1. **Trend Direction**: Is the measurement increasing, decreasing, or staying stable?
 2. **Rate of Change**: How quickly is the change happening?
@@ -70,8 +65,8 @@ Do NOT include:
 5. **Recommendations**: What actions could help continue positive trends or address negative ones?
 
 Provide a clear, structured analysis with specific numbers and actionable insights.""",
-            
-            'comparison': """Compare the fitness data between different periods or measurements. Focus on:
+    
+    'comparison': """Compare the fitness data between different periods or measurements. Focus on:
 
 1. **Direct Comparison**: What are the specific differences between the periods?
 2. **Percentage Changes**: Calculate and explain percentage changes where relevant
@@ -80,15 +75,15 @@ Provide a clear, structured analysis with specific numbers and actionable insigh
 5. **Insights**: What does this comparison tell us about progress?
 
 Present the comparison clearly with specific numbers and context.""",
-            
-            'specific': """Provide ONLY the specific measurement requested. Focus on:
+    
+    'specific': """Provide ONLY the specific measurement requested. Focus on:
 
 1. **Current Value**: What is the specific measurement?
 2. **Date**: When was this measurement taken?
 
 Give ONLY the requested information with the date. No extra context, implications, or recommendations unless specifically asked.""",
-            
-            'summary': """Provide a comprehensive summary of the fitness journey. Focus on:
+    
+    'summary': """Provide a comprehensive summary of the fitness journey. Focus on:
 
 1. **Overall Progress**: What has been achieved over the entire period?
 2. **Key Metrics**: Highlight the most important measurements and changes
@@ -98,8 +93,8 @@ Give ONLY the requested information with the date. No extra context, implication
 6. **Recommendations**: What should be the focus going forward?
 
 Create a motivating but realistic summary that celebrates progress and identifies opportunities.""",
-            
-            'goal': """Analyze progress toward fitness goals and provide goal-oriented insights. Focus on:
+    
+    'goal': """Analyze progress toward fitness goals and provide goal-oriented insights. Focus on:
 
 1. **Goal Assessment**: How well are current goals being met?
 2. **Progress Tracking**: What progress has been made toward specific goals?
@@ -109,33 +104,9 @@ Create a motivating but realistic summary that celebrates progress and identifie
 6. **Action Plan**: What specific actions will help achieve goals?
 
 Provide goal-focused analysis with clear next steps and motivation."""
-        }
-    
-    def get_prompt_for_query(self, query_type: str, context: List[Dict[str, Any]], 
-                           query: str, analytics_data: Dict[str, Any] = None) -> str:
-        """
-        Get a complete prompt for a specific query type
-        
-        Args:
-            query_type: Type of query (trend, comparison, specific, summary, goal)
-            context: Retrieved context from vector database
-            query: Original user query
-            
-        Returns:
-            Complete prompt string
-        """
-        try:
-            # Get base prompt for query type
-            base_prompt = self.query_prompts.get(query_type, self.query_prompts.get('specific', ''))
-            
-            # Format context
-            context_text = self._format_context(context)
-            
-            # Add analytics data to prompt if available
-            analytics_text = self._format_analytics_data(analytics_data) if analytics_data else ""
-            
-            # Build complete prompt
-            prompt = f"""{self.system_prompt}
+}
+
+_MAIN_PROMPT_TEMPLATE = _SYSTEM_PROMPT + """
 
 {base_prompt}
 
@@ -160,63 +131,475 @@ Based on the fitness data and analytics above, provide a comprehensive answer to
 - If analytics data shows warnings or validation issues, address them in your response
 
 Please provide your analysis:"""
+
+_HELP_PROMPT = _SYSTEM_PROMPT + """
+
+The user is asking for help or clarification about how to use the fitness data assistant.
+
+**Instructions**:
+Provide a helpful guide that explains:
+1. What types of questions you can answer
+2. How to ask questions effectively
+3. What kind of insights you can provide
+4. Examples of good questions to ask
+5. How to interpret the responses
+
+Be encouraging and make it easy for users to get started with analyzing their fitness data.
+
+Provide your help response:"""
+
+# Context text returned when there are no documents or formatting fails; callers
+# can compare against these with `is`
+_EMPTY_CONTEXT_TEXT = "No fitness data available."
+_CONTEXT_ERROR_TEXT = "Error formatting fitness data context."
+
+# Static text and placeholder names of the main template, for streaming it in pieces
+_MAIN_PROMPT_SEGMENTS = tuple(
+    (literal_text, field_name)
+    for literal_text, field_name, _, _ in Formatter().parse(_MAIN_PROMPT_TEMPLATE)
+)
+
+# Everything before the user query depends only on the query type. Building each
+# prefix once keeps it byte-identical across requests, so LLM servers with
+# prefix caching (e.g. vLLM with enable_prefix_caching) can reuse its KV cache.
+_QUERY_SEGMENT_INDEX = next(
+    i for i, (_, field_name) in enumerate(_MAIN_PROMPT_SEGMENTS) if field_name == "query"
+)
+_MAIN_PROMPT_PREFIXES = {
+    query_type: "".join(
+        literal_text + (base_prompt if field_name == "base_prompt" else "")
+        for literal_text, field_name in _MAIN_PROMPT_SEGMENTS[:_QUERY_SEGMENT_INDEX]
+    ) + _MAIN_PROMPT_SEGMENTS[_QUERY_SEGMENT_INDEX][0]
+    for query_type, base_prompt in _QUERY_PROMPTS.items()
+}
+_MAIN_PROMPT_SUFFIX_SEGMENTS = (("", "query"),) + _MAIN_PROMPT_SEGMENTS[_QUERY_SEGMENT_INDEX + 1:]
+
+_BATCH_PROMPT_TEMPLATE = _SYSTEM_PROMPT + """
+
+{guidance}
+
+**Available Fitness Data**:
+{context_text}
+
+{analytics_text}
+
+**Instructions**: 
+Answer each of the numbered questions below using the fitness data and analytics above. Answer every question independently, following the guidance for its type.
+
+**Response Format**:
+Respond with one answer per question, each starting on a new line with the question's number in square brackets:
+{answer_format}
+
+**Questions**:
+{questions}
+
+Please provide your answers:"""
+
+# Short prompt for single-measurement lookups, without analytics or response scaffolding
+_SPECIFIC_PROMPT_TEMPLATE = _SYSTEM_PROMPT + """
+
+**User Query**: {query}
+
+**Available Fitness Data**:
+{context_text}
+
+Answer the query directly with the exact value, unit and date from the data above:"""
+
+# Matches "[n] answer" blocks in a batch response, up to the next marker or the end
+_BATCH_ANSWER_PATTERN = re.compile(r'^\[(\d+)\]\s*(.*?)(?=^\[\d+\]|\Z)', re.M | re.S)
+
+# Top-level analytics sections rendered by _format_analytics_data
+_ANALYTICS_SECTIONS = ('data_summary', 'calculations', 'validation', 'warnings', 'trends')
+
+# Data summary fields shown in the analytics section, in display order
+_SUMMARY_FIELDS = (
+    ('total_records', "- Total records: {}"),
+    ('weeks_count', "- Weeks of data: {}"),
+    ('total_weight_loss', "- Total weight loss: {:.2f} kg"),
+)
+
+# Validation lists shown in the analytics section, with their headings
+_VALIDATION_LISTS = (
+    ('issues', "- Issues found:"),
+    ('warnings', "- Warnings:"),
+)
+
+# Query type keywords, in priority order; a query takes the first type with a keyword
+_QUERY_TYPE_KEYWORDS = (
+    ('trend', ("trend", "changed", "progress", "improved", "decreased", "increased")),
+    ('comparison', ("compare", "difference", "vs", "versus", "between")),
+    ('summary', ("summary", "overview", "journey", "overall")),
+    ('goal', ("goal", "target", "achieving", "progress toward")),
+)
+
+# Zero-width lookahead so every keyword occurrence is seen, even inside another match
+_QUERY_TYPE_PATTERN = re.compile("(?=" + "|".join(
+    f"(?P<{query_type}>{'|'.join(map(re.escape, keywords))})"
+    for query_type, keywords in _QUERY_TYPE_KEYWORDS
+) + ")")
+
+_QUERY_TYPE_PRIORITY = {query_type: i for i, (query_type, _) in enumerate(_QUERY_TYPE_KEYWORDS)}
+
+
+# Tokenizer used to budget context tokens, loaded on first use
+# (None: not loaded yet, False: unavailable)
+_token_encoding = None
+
+
+def _count_tokens(text: str) -> int:
+    """
+    Count the tokens in a piece of prompt text
+    
+    Uses tiktoken's cl100k_base encoding when available and otherwise
+    estimates about four characters per token.
+    
+    Args:
+        text: Text to count
+        
+    Returns:
+        Number of tokens
+    """
+    global _token_encoding
+    if _token_encoding is None:
+        try:
+            import tiktoken
+            _token_encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception as e:
+            print(f"⚠️ Token encoding unavailable, estimating token counts: {e}")
+            _token_encoding = False
+    
+    if _token_encoding is False:
+        return len(text) // 4 + 1
+    return len(_token_encoding.encode(text))
+
+
+def _document_date(doc: Dict[str, Any]) -> str:
+    """Date of a context document, used to order context by recency"""
+    return doc.get('metadata', {}).get('date', '')
+
+
+@lru_cache(maxsize=256)
+def _classify_query(query_lower: str) -> str:
+    """Classify a lowercased query, memoized for repeated queries"""
+    matched = {match.lastgroup for match in _QUERY_TYPE_PATTERN.finditer(query_lower)}
+    if not matched:
+        return 'specific'
+    return min(matched, key=_QUERY_TYPE_PRIORITY.__getitem__)
+
+# Metadata fields shown in each context document header, in display order
+_METADATA_LABELS = (('type', 'Type'), ('date', 'Date'), ('week_number', 'Week'))
+
+
+def _document_cache_key(doc: Dict[str, Any]) -> Tuple:
+    """Everything _format_document renders for a document, as a hashable cache key"""
+    metadata = doc.get('metadata', {})
+    return (
+        doc.get('id'), hash(doc.get('content', '')), doc.get('relevance_score', 0),
+        tuple(metadata.get(key) for key, _ in _METADATA_LABELS)
+    )
+
+
+class FitnessPrompts:
+    """Specialized prompts for fitness data analysis"""
+    
+    __slots__ = ("system_prompt", "query_prompts", "_context_cache", "_context_cache_size",
+                 "_context_cache_lock")
+    
+    def __init__(self):
+        """Initialize fitness prompts"""
+        self.system_prompt = _SYSTEM_PROMPT
+        self.query_prompts = _QUERY_PROMPTS
+        
+        # Small FIFO cache of formatted context, reused when the same retrieved
+        # context is formatted for several prompts; the instance is shared across threads
+        self._context_cache: OrderedDict = OrderedDict()
+        self._context_cache_size = 8
+        self._context_cache_lock = threading.Lock()
+    
+    def classify_query(self, query: str) -> str:
+        """
+        Classify a query into one of the prompt types
+        
+        Args:
+            query: User query
             
-            return prompt
+        Returns:
+            Query type (trend, comparison, summary, goal or specific)
+        """
+        return _classify_query(query.lower())
+    
+    def get_prompt_for_query(self, query_type: str, context: List[Dict[str, Any]], 
+                           query: str, analytics_data: Dict[str, Any] = None,
+                           presorted: bool = False, top_k: Optional[int] = None,
+                           max_context_tokens: Optional[int] = None) -> str:
+        """
+        Get a complete prompt for a specific query type
+        
+        Args:
+            query_type: Type of query (trend, comparison, specific, summary, goal)
+            context: Retrieved context from vector database
+            query: Original user query
+            presorted: Whether context is already sorted by date (most recent first)
+            top_k: Only include the top_k most recent documents (all when None)
+            max_context_tokens: Token budget for the context documents (no limit when None)
             
+        Returns:
+            Complete prompt string
+        """
+        try:
+            return "".join(self.iter_prompt_for_query(query_type, context, query, analytics_data,
+                                                     presorted, top_k, max_context_tokens))
         except Exception as e:
             print(f"❌ Error creating prompt: {e}")
             return self._get_fallback_prompt(query, context)
     
-    def _format_context(self, context: List[Dict[str, Any]]) -> str:
+    def iter_prompt_for_query(self, query_type: str, context: List[Dict[str, Any]],
+                              query: str, analytics_data: Dict[str, Any] = None,
+                              presorted: bool = False, top_k: Optional[int] = None,
+                              max_context_tokens: Optional[int] = None) -> Iterator[str]:
+        """
+        Yield the prompt for get_prompt_for_query in chunks
+        
+        Lets callers stream the prompt into a request body without building one
+        large string. Unlike get_prompt_for_query, errors are not caught.
+        
+        Args:
+            query_type: Type of query (trend, comparison, specific, summary, goal)
+            context: Retrieved context from vector database
+            query: Original user query
+            analytics_data: Analytics data to include
+            presorted: Whether context is already sorted by date (most recent first)
+            top_k: Only include the top_k most recent documents (all when None)
+            max_context_tokens: Token budget for the context documents (no limit when None)
+            
+        Yields:
+            Consecutive pieces of the prompt
+        """
+        # Missing placeholders (no analytics data) format as empty strings
+        values = defaultdict(
+            str,
+            query=query,
+            context_text=self._format_context(context, presorted, top_k, max_context_tokens)
+        )
+        
+        # Add analytics data to prompt if available
+        if analytics_data:
+            values["analytics_text"] = self._format_analytics_data(analytics_data)
+        
+        yield self.get_prompt_prefix(query_type)
+        for literal_text, field_name in _MAIN_PROMPT_SUFFIX_SEGMENTS:
+            if literal_text:
+                yield literal_text
+            if field_name is not None:
+                yield values[field_name]
+    
+    def get_prompt_prefix(self, query_type: str) -> str:
+        """
+        Get the fixed start of the prompt for a query type
+        
+        Every prompt of the same type starts with this exact string, which lets
+        LLM servers with prefix caching skip prefill for it after the first request.
+        
+        Args:
+            query_type: Type of query (unknown types fall back to specific)
+            
+        Returns:
+            Prompt prefix, ending just before the user query
+        """
+        return _MAIN_PROMPT_PREFIXES.get(query_type, _MAIN_PROMPT_PREFIXES['specific'])
+    
+    def get_specific_prompt(self, query: str, context: List[Dict[str, Any]],
+                            presorted: bool = False, top_k: Optional[int] = None) -> str:
+        """
+        Get a short prompt for a specific measurement lookup
+        
+        Leaves out analytics data and the general response instructions, so the
+        prompt is much smaller than get_prompt_for_query's for the same context.
+        
+        Args:
+            query: Original user query
+            context: Retrieved context from vector database
+            presorted: Whether context is already sorted by date (most recent first)
+            top_k: Only include the top_k most recent documents (all when None)
+            
+        Returns:
+            Specific query prompt string
+        """
+        try:
+            return _SPECIFIC_PROMPT_TEMPLATE.format_map({
+                "query": query,
+                "context_text": self._format_context(context, presorted, top_k)
+            })
+            
+        except Exception as e:
+            print(f"❌ Error creating specific prompt: {e}")
+            return self._get_fallback_prompt(query, context)
+    
+    def get_batch_prompt(self, queries: List[Tuple[str, str]], context: List[Dict[str, Any]],
+                         analytics_data: Dict[str, Any] = None, presorted: bool = False) -> str:
+        """
+        Get a single prompt answering several queries over the same context
+        
+        Args:
+            queries: List of (query_type, query) pairs
+            context: Retrieved context from vector database
+            analytics_data: Analytics data shared by all queries
+            presorted: Whether context is already sorted by date (most recent first)
+            
+        Returns:
+            Batch prompt string; answers are numbered [1], [2], ... in query order
+        """
+        try:
+            # Unknown query types fall back to 'specific', as in get_prompt_for_query
+            resolved = [
+                (query_type if query_type in self.query_prompts else 'specific', query)
+                for query_type, query in queries
+            ]
+            
+            # Include the guidance for each distinct query type once
+            guidance = "\n\n".join(
+                f"**Guidance for {query_type} questions**:\n{self.query_prompts[query_type]}"
+                for query_type in dict.fromkeys(query_type for query_type, _ in resolved)
+            )
+            
+            context_text = self._format_context(context, presorted)
+            analytics_text = self._format_analytics_data(analytics_data) if analytics_data else ""
+            
+            return _BATCH_PROMPT_TEMPLATE.format_map({
+                "guidance": guidance,
+                "context_text": context_text,
+                "analytics_text": analytics_text,
+                "answer_format": "\n".join(f"[{i}] <answer to question {i}>" for i in range(1, len(resolved) + 1)),
+                "questions": "\n".join(
+                    f"[{i}] (type={query_type}) {query}" for i, (query_type, query) in enumerate(resolved, 1)
+                )
+            })
+            
+        except Exception as e:
+            print(f"❌ Error creating batch prompt: {e}")
+            return self._get_fallback_prompt("\n".join(query for _, query in queries), context)
+    
+    def parse_batch_response(self, response_text: str) -> Dict[int, str]:
+        """
+        Split a response to a batch prompt into per-question answers
+        
+        Args:
+            response_text: LLM response to a prompt from get_batch_prompt
+            
+        Returns:
+            Dictionary mapping 1-based question number to answer text
+        """
+        return {
+            int(number): answer.strip()
+            for number, answer in _BATCH_ANSWER_PATTERN.findall(response_text or "")
+        }
+    
+    def _format_context(self, context: List[Dict[str, Any]], presorted: bool = False,
+                        top_k: Optional[int] = None, max_tokens: Optional[int] = None) -> str:
         """
         Format context data for the prompt
         
         Args:
             context: List of context documents
+            presorted: Skip sorting when context is already sorted by date (most recent first)
+            top_k: Only include the top_k most recent documents (all when None)
+            max_tokens: Stop adding documents once this many tokens are used; the
+                most recent document is always kept (no limit when None)
             
         Returns:
             Formatted context string
         """
         try:
             if not context:
-                return "No fitness data available."
+                return _EMPTY_CONTEXT_TEXT
+            
+            # Keyed on document content, so a list mutated or rebuilt in place never hits a stale entry
+            cache_key = (
+                presorted, top_k, max_tokens,
+                tuple(_document_cache_key(doc) for doc in context)
+            )
+            with self._context_cache_lock:
+                cached = self._context_cache.get(cache_key)
+            if cached is not None:
+                return cached
             
             # Sort context by date (most recent first)
-            sorted_context = sorted(context, key=lambda x: x.get('metadata', {}).get('date', ''), reverse=True)
-            
-            formatted_context = []
-            
-            for i, doc in enumerate(sorted_context, 1):
-                content = doc.get('content', '')
-                metadata = doc.get('metadata', {})
-                score = doc.get('relevance_score', 0)
-                
-                # Add document header
-                doc_header = f"Document {i} (Relevance: {score:.2f})"
-                
-                # Add metadata info
-                metadata_info = []
-                if metadata.get('type'):
-                    metadata_info.append(f"Type: {metadata['type']}")
-                if metadata.get('date'):
-                    metadata_info.append(f"Date: {metadata['date']}")
-                if metadata.get('week_number'):
-                    metadata_info.append(f"Week: {metadata['week_number']}")
-                
-                if metadata_info:
-                    doc_header += f" - {', '.join(metadata_info)}"
-                
-                # Highlight most recent data
-                if i == 1:
-                    doc_header += " [MOST RECENT DATA]"
-                
-                formatted_context.append(f"{doc_header}\n{content}")
-            
-            return "\n\n".join(formatted_context)
+            if presorted:
+                sorted_context = context if top_k is None else context[:top_k]
+            elif top_k is not None and top_k < len(context):
+                # Partial selection instead of sorting every document
+                sorted_context = heapq.nlargest(top_k, context, key=_document_date)
+            else:
+                sorted_context = self.sort_context(context)
+            
+            if max_tokens is None:
+                context_text = "\n\n".join(
+                    self._format_document(i, doc) for i, doc in enumerate(sorted_context, 1)
+                )
+            else:
+                documents = []
+                token_count = 0
+                for i, doc in enumerate(sorted_context, 1):
+                    document_text = self._format_document(i, doc)
+                    token_count += _count_tokens(document_text)
+                    if documents and token_count > max_tokens:
+                        break
+                    documents.append(document_text)
+                context_text = "\n\n".join(documents)
+            
+            # Evict the oldest entry when full
+            with self._context_cache_lock:
+                if cache_key not in self._context_cache and len(self._context_cache) >= self._context_cache_size:
+                    self._context_cache.popitem(last=False)
+                self._context_cache[cache_key] = context_text
+            
+            return context_text
             
         except Exception as e:
             print(f"❌ Error formatting context: {e}")
-            return "Error formatting fitness data context."
+            return _CONTEXT_ERROR_TEXT
+    
+    def sort_context(self, context: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Sort context documents by date, most recent first
+        
+        Args:
+            context: List of context documents
+            
+        Returns:
+            New list of documents sorted by date
+        """
+        # Look up each date once instead of on every comparison
+        dates = [_document_date(doc) for doc in context]
+        order = sorted(range(len(context)), key=dates.__getitem__, reverse=True)
+        return [context[i] for i in order]
+    
+    def _format_document(self, index: int, doc: Dict[str, Any]) -> str:
+        """
+        Format a single context document
+        
+        Args:
+            index: 1-based position of the document in the sorted context
+            doc: Context document
+            
+        Returns:
+            Formatted document string
+        """
+        metadata = doc.get('metadata', {})
+        
+        # Add metadata info
+        metadata_info = ", ".join(
+            f"{label}: {metadata[key]}"
+            for key, label in _METADATA_LABELS
+            if metadata.get(key)
+        )
+        metadata_suffix = f" - {metadata_info}" if metadata_info else ""
+        
+        # Highlight most recent data
+        recent_marker = " [MOST RECENT DATA]" if index == 1 else ""
+        
+        return (f"Document {index} (Relevance: {doc.get('relevance_score', 0):.2f})"
+                f"{metadata_suffix}{recent_marker}\n{doc.get('content', '')}")
     
     def _format_analytics_data(self, analytics_data: Dict[str, Any]) -> str:
         """
@@ -229,7 +612,8 @@ Please provide your analysis:"""
             Formatted analytics text
         """
         try:
-            if not analytics_data:
+            # Nothing to show unless at least one section has content
+            if not analytics_data or not any(analytics_data.get(key) for key in _ANALYTICS_SECTIONS):
                 return ""
             
             analytics_lines = ["**Analytics Data**:", ""]
@@ -238,12 +622,9 @@ Please provide your analysis:"""
             if 'data_summary' in analytics_data:
                 summary = analytics_data['data_summary']
                 analytics_lines.append("**Data Summary**:")
-                if 'total_records' in summary:
-                    analytics_lines.append(f"- Total records: {summary['total_records']}")
-                if 'weeks_count' in summary:
-                    analytics_lines.append(f"- Weeks of data: {summary['weeks_count']}")
-                if 'total_weight_loss' in summary:
-                    analytics_lines.append(f"- Total weight loss: {summary['total_weight_loss']:.2f} kg")
+                for key, line_format in _SUMMARY_FIELDS:
+                    if key in summary:
+                        analytics_lines.append(line_format.format(summary[key]))
                 if 'date_range' in summary:
                     date_range = summary['date_range']
                     if 'start' in date_range and 'end' in date_range:
@@ -255,13 +636,10 @@ Please provide your analysis:"""
                 calculations = analytics_data['calculations']
                 analytics_lines.append("**Calculations**:")
                 for calc_name, calc_data in calculations.items():
-                    if isinstance(calc_data, dict):
-                        if 'value' in calc_data:
-                            unit = calc_data.get('unit', '')
-                            confidence = calc_data.get('confidence', 0)
-                            analytics_lines.append(f"- {calc_name}: {calc_data['value']:.2f} {unit} (confidence: {confidence:.2f})")
-                        else:
-                            analytics_lines.append(f"- {calc_name}: {calc_data}")
+                    if isinstance(calc_data, dict) and 'value' in calc_data:
+                        unit = calc_data.get('unit', '')
+                        confidence = calc_data.get('confidence', 0)
+                        analytics_lines.append(f"- {calc_name}: {calc_data['value']:.2f} {unit} (confidence: {confidence:.2f})")
                     else:
                         analytics_lines.append(f"- {calc_name}: {calc_data}")
                 analytics_lines.append("")
@@ -273,14 +651,10 @@ Please provide your analysis:"""
                 if 'valid' in validation:
                     status = "✅ Valid" if validation['valid'] else "❌ Invalid"
                     analytics_lines.append(f"- Data quality: {status}")
-                if 'issues' in validation and validation['issues']:
-                    analytics_lines.append("- Issues found:")
-                    for issue in validation['issues']:
-                        analytics_lines.append(f"  • {issue}")
-                if 'warnings' in validation and validation['warnings']:
-                    analytics_lines.append("- Warnings:")
-                    for warning in validation['warnings']:
-                        analytics_lines.append(f"  • {warning}")
+                for key, heading in _VALIDATION_LISTS:
+                    if validation.get(key):
+                        analytics_lines.append(heading)
+                        analytics_lines.extend(f"  • {item}" for item in validation[key])
                 analytics_lines.append("")
             
             # Add warnings
@@ -334,7 +708,8 @@ Fitness Data:
 Please provide a helpful response based on the available data. If you don't have enough information, let the user know what additional data would be helpful."""
     
     def get_follow_up_prompt(self, original_query: str, original_response: str,
-                           follow_up_query: str, context: List[Dict[str, Any]]) -> str:
+                           follow_up_query: str, context: List[Dict[str, Any]],
+                           presorted: bool = False) -> str:
         """
         Get a prompt for follow-up questions
         
@@ -343,12 +718,13 @@ Please provide a helpful response based on the available data. If you don't have
             original_response: Previous response
             follow_up_query: New follow-up query
             context: Updated context data
+            presorted: Whether context is already sorted by date (most recent first)
             
         Returns:
             Follow-up prompt string
         """
         try:
-            context_text = self._format_context(context)
+            context_text = self._format_context(context, presorted)
             
             return f"""{self.system_prompt}
 
@@ -396,34 +772,21 @@ Provide your response:"""
     
     def get_help_prompt(self) -> str:
         """Get a prompt for help responses"""
-        return f"""{self.system_prompt}
-
-The user is asking for help or clarification about how to use the fitness data assistant.
-
-**Instructions**:
-Provide a helpful guide that explains:
-1. What types of questions you can answer
-2. How to ask questions effectively
-3. What kind of insights you can provide
-4. Examples of good questions to ask
-5. How to interpret the responses
-
-Be encouraging and make it easy for users to get started with analyzing their fitness data.
-
-Provide your help response:"""
+        return _HELP_PROMPT
     
-    def get_summary_prompt(self, context: List[Dict[str, Any]]) -> str:
+    def get_summary_prompt(self, context: List[Dict[str, Any]], presorted: bool = False) -> str:
         """
         Get a prompt for generating data summaries
         
         Args:
             context: Context data
+            presorted: Whether context is already sorted by date (most recent first)
             
         Returns:
             Summary prompt string
         """
         try:
-            context_text = self._format_context(context)
+            context_text = self._format_context(context, presorted)
             
             return f"""{self.system_prompt}
 
@@ -447,4 +810,15 @@ Please provide your comprehensive summary:"""
             
         except Exception as e:
             print(f"❌ Error creating summary prompt: {e}")
-            return self._get_fallback_prompt("Provide a summary of my fitness journey", context) 
\ No newline at end of file
+            return self._get_fallback_prompt("Provide a summary of my fitness journey", context) 
+
+
+@lru_cache(maxsize=None)
+def get_fitness_prompts() -> FitnessPrompts:
+    """
+    Get the shared FitnessPrompts instance
+    
+    Returns:
+        FitnessPrompts instance created on first call and reused afterwards
+    """
+    return FitnessPrompts()
@@ -3,10 +3,236 @@ Query Processor Module for RAG Pipeline
 Handles natural language query processing and enhancement
 """
 
+import calendar
 import re
+from collections import OrderedDict
+from functools import lru_cache
 from typing import List, Dict, Any, Optional, Tuple
-from datetime import datetime, timedelta
-from .utils.embeddings import EmbeddingManager
+from datetime import date, datetime, timedelta
+
+
+# Priority order for query types (more specific first)
+_QUERY_TYPE_PRIORITY = (
+    'time_range_analysis',
+    'calculation_request',
+    'data_summary',
+    'trend',
+    'comparison',
+    'goal',
+    'summary',
+    'specific'
+)
+
+# Entity patterns, compiled once
+_DATE_PATTERN = re.compile(r'\d{4}-\d{2}-\d{2}')
+_NUMBER_PATTERN = re.compile(r'\d+(?:\.\d+)?')
+_TIME_PERIOD_PATTERNS = {
+    "week": re.compile(r'(\d+)\s*(week|wk)s?', re.IGNORECASE),
+    "month": re.compile(r'(\d+)\s*(month|mo)s?', re.IGNORECASE),
+    "year": re.compile(r'(\d+)\s*(year|yr)s?', re.IGNORECASE),
+    "days": re.compile(r'(\d+)\s*(day|d)s?', re.IGNORECASE)
+}
+
+_COMPARISON_TERMS = ("vs", "versus", "compare", "difference", "between")
+
+# Enhanced query templates per query type, filled with each measurement keyword
+_MEASUREMENT_QUERY_TEMPLATES = {
+    "trend": ("{} trend over time", "{} changes progress"),
+    "comparison": ("{} comparison", "{} difference"),
+    "specific": ("{} measurements", "current {}")
+}
+
+# Fixed enhanced queries added for some query types
+_QUERY_TYPE_ENHANCEMENTS = {
+    "summary": ("fitness data summary", "overall statistics", "complete measurements overview"),
+    "goal": ("progress toward goals", "achievement analysis", "performance evaluation")
+}
+
+# Common fitness query patterns offered as suggestions, with their lowercase forms
+_COMMON_QUERY_PATTERNS = tuple((pattern, pattern.lower()) for pattern in (
+    "How has my weight changed",
+    "Show me my fat percentage trends",
+    "What's my BMI progression",
+    "Compare my measurements from week",
+    "Give me a summary of my fitness journey",
+    "What are my current body measurements",
+    "Am I making progress toward my goals",
+    "Show me my chest measurements",
+    "What was my weight on",
+    "How did my body composition change"
+))
+
+# Suggestions offered for each measurement keyword in a partial query
+_KEYWORD_SUGGESTION_TEMPLATES = (
+    "Show me my {} trends",
+    "What's my current {}",
+    "Compare my {} over time"
+)
+
+# Maximum number of query suggestions returned
+_MAX_SUGGESTIONS = 10
+
+# Explicit date formats, matched in one pass
+_EXPLICIT_DATE_PATTERN = re.compile(
+    r'\d{4}-\d{2}-\d{2}'  # YYYY-MM-DD
+    r'|\d{1,2}/\d{1,2}/\d{4}'  # MM/DD/YYYY or DD/MM/YYYY
+    r'|\d{1,2}-\d{1,2}-\d{4}'  # MM-DD-YYYY or DD-MM-YYYY
+    r'|\d{1,2}\.\d{1,2}\.\d{4}'  # MM.DD.YYYY or DD.MM.YYYY
+)
+
+# Relative time patterns
+_RELATIVE_PATTERNS = {
+    'this_week': re.compile(r'(this\s+week|current\s+week|past\s+7\s+days)'),
+    'last_week': re.compile(r'(last\s+week|previous\s+week|past\s+week)'),
+    'this_month': re.compile(r'(this\s+month|current\s+month|past\s+30\s+days)'),
+    'last_month': re.compile(r'(last\s+month|previous\s+month|past\s+month)'),
+    'this_year': re.compile(r'(this\s+year|current\s+year|past\s+year)'),
+    'last_year': re.compile(r'(last\s+year|previous\s+year|past\s+year)'),
+    'yesterday': re.compile(r'(yesterday|day\s+before)'),
+    'today': re.compile(r'(today|current\s+day)'),
+    'tomorrow': re.compile(r'(tomorrow|next\s+day)')
+}
+
+# Month and season names used for date ranges
+_MONTHS = {
+    'january': '01', 'february': '02', 'march': '03', 'april': '04',
+    'may': '05', 'june': '06', 'july': '07', 'august': '08',
+    'september': '09', 'october': '10', 'november': '11', 'december': '12'
+}
+_SEASONS = {
+    'spring': {'start_month': '03', 'end_month': '05'},
+    'summer': {'start_month': '06', 'end_month': '08'},
+    'autumn': {'start_month': '09', 'end_month': '11'},
+    'fall': {'start_month': '09', 'end_month': '11'},
+    'winter': {'start_month': '12', 'end_month': '02'}
+}
+
+# Month mentions with the phrase that sets their range type
+_MONTH_CONTEXT_PATTERN = re.compile(
+    "(until end of|till end of|in|since) (" + "|".join(_MONTHS) + ")"
+)
+_MONTH_PREFIX_TYPES = {
+    'until end of': 'month_end',
+    'till end of': 'month_end',
+    'in': 'month_period',
+    'since': 'month_since'
+}
+
+# Month range types in precedence order, with the phrase reported for each
+_MONTH_RANGE_TYPES = ('month_end', 'month_period', 'month_since')
+_MONTH_RANGE_PREFIXES = {
+    'month_end': 'until end of',
+    'month_period': 'in',
+    'month_since': 'since'
+}
+
+# Quick check that skips the per-season scans when no season is mentioned
+_ANY_SEASON_PATTERN = re.compile("|".join(_SEASONS))
+
+_WHITESPACE_PATTERN = re.compile(r'\s+')
+_PUNCTUATION_PATTERN = re.compile(r'[^\w\s\-]')
+
+# Common variations replaced by normalize_query, applied in one pass
+_NORMALIZE_REPLACEMENTS = {
+    'fat %': 'fat_percent',
+    'fat percent': 'fat_percent',
+    'body mass index': 'bmi',
+    'body fat': 'fat_percent',
+    'vs': 'versus',
+    'wk': 'week',
+    'mo': 'month',
+    'yr': 'year'
+}
+_NORMALIZE_PATTERN = re.compile("|".join(
+    re.escape(old) for old in sorted(_NORMALIZE_REPLACEMENTS, key=len, reverse=True)
+))
+
+# Days per time period unit used for date filters (other units count as days)
+_PERIOD_DAYS = {"week": 7, "month": 30, "year": 365}
+
+
+@lru_cache(maxsize=64)
+def _period_date_range(days: int, today_ordinal: int) -> Tuple[str, str]:
+    """
+    Get the ISO start and end dates of the last `days` days
+    
+    Args:
+        days: Length of the period in days
+        today_ordinal: Proleptic ordinal of today's date, so entries expire daily
+        
+    Returns:
+        Tuple of (start_date, end_date) strings
+    """
+    end_date = date.fromordinal(today_ordinal)
+    start_date = end_date - timedelta(days=days)
+    return start_date.isoformat(), end_date.isoformat()
+
+
+def _compile_query_pattern(pattern: str) -> re.Pattern:
+    """
+    Compile a query classification pattern without catastrophic backtracking
+    
+    Patterns such as '(a|b).*(c|d).*(e)' make the backtracking engine retry
+    every combination of matches, which is polynomial in the query length
+    when they fail. Each group only needs to occur after the previous one on
+    the same line, so the earliest occurrence of each is taken and never
+    revisited, inside atomic groups. Patterns that are not such a chain of
+    groups are compiled unchanged, as is every pattern on Python versions
+    before 3.11, which lack atomic groups.
+    
+    Args:
+        pattern: Regular expression from QueryProcessor.query_patterns
+        
+    Returns:
+        Compiled case-insensitive pattern
+    """
+    parts = pattern.split('.*')
+    if len(parts) > 1:
+        try:
+            for part in parts:
+                re.compile(part)
+            return re.compile(
+                '^' + ''.join(f'(?>.*?{part})' for part in parts),
+                re.IGNORECASE | re.MULTILINE
+            )
+        except re.error:
+            # Not a chain of valid groups, or no atomic group support (Python < 3.11)
+            pass
+    return re.compile(pattern, re.IGNORECASE)
+
+
+def _parse_explicit_date(date_str: str) -> Optional[Tuple[datetime, str]]:
+    """
+    Parse an explicit date without trying each strptime format in turn
+    
+    The separator picks the candidate formats; month-first is tried before
+    day-first, as in the '%m/%d/%Y', '%d/%m/%Y' format order.
+    
+    Args:
+        date_str: Date string matched by _EXPLICIT_DATE_PATTERN
+        
+    Returns:
+        Tuple of (parsed datetime, equivalent strptime format), or None
+    """
+    if len(date_str) == 10 and date_str[4] == '-':
+        try:
+            return datetime.fromisoformat(date_str), '%Y-%m-%d'
+        except ValueError:
+            return None
+    
+    for separator in ('/', '-'):
+        parts = date_str.split(separator)
+        if len(parts) == 3:
+            first, second, year = map(int, parts)
+            for month, day, fmt in ((first, second, f'%m{separator}%d{separator}%Y'),
+                                    (second, first, f'%d{separator}%m{separator}%Y')):
+                try:
+                    return datetime(year, month, day), fmt
+                except ValueError:
+                    continue
+            return None
+    
+    return None
 
 
 class QueryProcessor:
@@ -19,7 +245,14 @@ class QueryProcessor:
         Args:
             embedding_provider: Embedding provider to use
         """
-        self.embedding_manager = EmbeddingManager(embedding_provider)
+        # The embedding model is loaded on first use, so parsing and validation
+        # work without it
+        self._embedding_provider = embedding_provider
+        self._embedding_manager = None
+        
+        # FIFO cache of query embeddings, so repeated queries skip the model
+        self._embedding_cache: OrderedDict = OrderedDict()
+        self._embedding_cache_size = 4096
         
         # Define query patterns
         self.query_patterns = {
@@ -78,6 +311,37 @@ class QueryProcessor:
             'body_measurements': ['neck', 'shoulders', 'biceps', 'forearms', 'chest', 
                                 'above navel', 'navel', 'waist', 'hips', 'thighs', 'calves']
         }
+        
+        # Compile query patterns once instead of on every classification
+        self._compiled_query_patterns = {
+            query_type: [_compile_query_pattern(pattern) for pattern in patterns]
+            for query_type, patterns in self.query_patterns.items()
+        }
+        
+        # Flattened (category, keyword) pairs for keyword matching
+        self._measurement_terms = [
+            (category, keyword)
+            for category, keywords in self.measurement_keywords.items()
+            for keyword in keywords
+        ]
+        
+        # FIFO cache of suggestions by normalized partial query
+        self._suggestion_cache: OrderedDict = OrderedDict()
+        self._suggestion_cache_size = 1024
+        
+        # Measurement-specific suggestions, formatted once per keyword
+        self._keyword_suggestions = [
+            (keyword, tuple(template.format(keyword) for template in _KEYWORD_SUGGESTION_TEMPLATES))
+            for _, keyword in self._measurement_terms
+        ]
+    
+    @property
+    def embedding_manager(self):
+        """Embedding manager, created on first access"""
+        if self._embedding_manager is None:
+            from .utils.embeddings import EmbeddingManager
+            self._embedding_manager = EmbeddingManager(self._embedding_provider)
+        return self._embedding_manager
     
     def process_query(self, query: str) -> Dict[str, Any]:
         """
@@ -95,71 +359,146 @@ class QueryProcessor:
             
             query = query.strip().lower()
             
-            # Analyze query type
-            query_type = self._classify_query(query)
-            
-            # Extract entities
-            entities = self._extract_entities(query)
-            
             # Generate query embedding
-            embedding = self.embedding_manager.get_single_embedding(query)
-            
-            # Create enhanced queries
-            enhanced_queries = self._enhance_query(query, query_type, entities)
-            
-            # Build filter criteria
-            filter_criteria = self._build_filter_criteria(query_type, entities)
-            
-            return {
-                "original_query": query,
-                "query_type": query_type,
-                "entities": entities,
-                "embedding": embedding,
-                "enhanced_queries": enhanced_queries,
-                "filter_criteria": filter_criteria,
-                "processed_at": datetime.now().isoformat()
-            }
+            embedding = self._get_query_embeddings([query])[query]
+            
+            return self._build_processed_query(query, embedding)
             
         except Exception as e:
             print(f"❌ Error processing query: {e}")
             return {"error": str(e)}
     
-    def _classify_query(self, query: str) -> str:
+    def process_queries(self, queries: List[str]) -> List[Dict[str, Any]]:
         """
-        Classify the type of query
+        Process several natural language queries with one embedding call
         
         Args:
-            query: Query string
+            queries: Natural language query strings
             
         Returns:
-            Query type (trend, comparison, specific, summary, goal, general)
+            List of processed query dictionaries, in the same order as queries
         """
         try:
-            # Define priority order for query types (more specific first)
-            priority_order = [
-                'time_range_analysis',
-                'calculation_request', 
-                'data_summary',
-                'trend',
-                'comparison',
-                'goal',
-                'summary',
-                'specific'
-            ]
+            normalized = [query.strip().lower() if query and query.strip() else None for query in queries]
             
-            # Check patterns in priority order
-            for query_type in priority_order:
-                if query_type in self.query_patterns:
-                    patterns = self.query_patterns[query_type]
-                    for pattern in patterns:
-                        if re.search(pattern, query, re.IGNORECASE):
-                            return query_type
+            # Embed every distinct query in one batch
+            embeddings = self._get_query_embeddings([query for query in normalized if query])
             
-            return "general"
+            return [
+                self._build_processed_query(query, embeddings[query]) if query else {"error": "Empty query"}
+                for query in normalized
+            ]
             
         except Exception as e:
-            print(f"❌ Error classifying query: {e}")
-            return "general"
+            print(f"❌ Error processing queries: {e}")
+            return [{"error": str(e)} for _ in queries]
+    
+    def get_query_embeddings(self, queries: List[str]) -> List[List[float]]:
+        """
+        Embed queries through the query embedding cache
+        
+        Args:
+            queries: Stripped, lowercased query strings
+            
+        Returns:
+            Embeddings in query order (empty if embedding failed)
+        """
+        embeddings = self._get_query_embeddings(queries)
+        if not all(len(embeddings[query]) for query in queries):
+            return []
+        
+        return [embeddings[query] for query in queries]
+    
+    def _build_processed_query(self, query: str, embedding: List[float]) -> Dict[str, Any]:
+        """
+        Build the processed query information for a normalized query
+        
+        Args:
+            query: Stripped, lowercased query string
+            embedding: Query embedding
+            
+        Returns:
+            Dictionary with processed query information
+        """
+        # Analyze query type
+        query_type = self._classify_query(query)
+        
+        # Extract entities
+        entities = self._extract_entities(query)
+        
+        # Create enhanced queries
+        enhanced_queries = self._enhance_query(query, query_type, entities)
+        
+        # Build filter criteria
+        filter_criteria = self._build_filter_criteria(query_type, entities)
+        
+        return {
+            "original_query": query,
+            "query_type": query_type,
+            "entities": entities,
+            "embedding": embedding,
+            "enhanced_queries": enhanced_queries,
+            "filter_criteria": filter_criteria,
+            "processed_at": datetime.now().isoformat()
+        }
+    
+    def _get_query_embeddings(self, queries: List[str]) -> Dict[str, List[float]]:
+        """
+        Get embeddings for normalized queries, reusing cached embeddings
+        
+        Queries missing from the cache are embedded together in one call.
+        
+        Args:
+            queries: Stripped, lowercased query strings
+            
+        Returns:
+            Dictionary mapping each query to its embedding (empty on failure)
+        """
+        embeddings = {}
+        missing = []
+        for query in queries:
+            if query in embeddings:
+                continue
+            embedding = self._embedding_cache.get(query)
+            if embedding is not None:
+                embeddings[query] = embedding
+            else:
+                embeddings[query] = []
+                missing.append(query)
+        
+        if missing:
+            new_embeddings = self.embedding_manager.get_embeddings(missing)
+            
+            # Failed calls return no embeddings; those queries keep an empty
+            # embedding and are not cached
+            if len(new_embeddings) == len(missing):
+                for query, embedding in zip(missing, new_embeddings):
+                    embeddings[query] = embedding
+                    if len(self._embedding_cache) >= self._embedding_cache_size:
+                        self._embedding_cache.popitem(last=False)
+                    self._embedding_cache[query] = embedding
+        
+        return embeddings
+    
+    def _classify_query(self, query: str) -> str:
+        """
+        Classify the type of query
+        
+        Args:
+            query: Query string
+            
+        Returns:
+            Query type (trend, comparison, specific, summary, goal, general)
+        """
+        # Check patterns in priority order
+        for query_type in _QUERY_TYPE_PRIORITY:
+            if query_type in self._compiled_query_patterns:
+                patterns = self._compiled_query_patterns[query_type]
+                for pattern in patterns:
+                    if pattern.search(query):
+                        return query_type
+        
+        return "general"
     
     def _extract_entities(self, query: str) -> Dict[str, Any]:
         """
@@ -171,62 +510,27 @@ class QueryProcessor:
         Returns:
             Dictionary with extracted entities
         """
-        try:
-            entities = {
-                "measurements": [],
-                "dates": [],
-                "time_periods": [],
-                "comparison_terms": [],
-                "numbers": []
-            }
-            
+        # Each entity list is built in one pass and the dict is created once
+        return {
             # Extract measurements
-            for category, keywords in self.measurement_keywords.items():
-                for keyword in keywords:
-                    if keyword in query:
-                        entities["measurements"].append({
-                            "category": category,
-                            "keyword": keyword
-                        })
-            
+            "measurements": [
+                {"category": category, "keyword": keyword}
+                for category, keyword in self._measurement_terms
+                if keyword in query
+            ],
             # Extract dates (YYYY-MM-DD format)
-            date_pattern = r'\d{4}-\d{2}-\d{2}'
-            dates = re.findall(date_pattern, query)
-            entities["dates"].extend(dates)
-            
+            "dates": _DATE_PATTERN.findall(query),
             # Extract time periods
-            time_patterns = {
-                "week": r'(\d+)\s*(week|wk)s?',
-                "month": r'(\d+)\s*(month|mo)s?',
-                "year": r'(\d+)\s*(year|yr)s?',
-                "days": r'(\d+)\s*(day|d)s?'
-            }
-            
-            for period_type, pattern in time_patterns.items():
-                matches = re.findall(pattern, query, re.IGNORECASE)
-                for match in matches:
-                    entities["time_periods"].append({
-                        "type": period_type,
-                        "value": int(match[0]),
-                        "unit": match[1]
-                    })
-            
+            "time_periods": [
+                {"type": period_type, "value": int(value), "unit": unit}
+                for period_type, pattern in _TIME_PERIOD_PATTERNS.items()
+                for value, unit in pattern.findall(query)
+            ],
             # Extract comparison terms
-            comparison_terms = ["vs", "versus", "compare", "difference", "between"]
-            for term in comparison_terms:
-                if term in query:
-                    entities["comparison_terms"].append(term)
-            
+            "comparison_terms": [term for term in _COMPARISON_TERMS if term in query],
             # Extract numbers
-            number_pattern = r'\d+(?:\.\d+)?'
-            numbers = re.findall(number_pattern, query)
-            entities["numbers"] = [float(num) for num in numbers]
-            
-            return entities
-            
-        except Exception as e:
-            print(f"❌ Error extracting entities: {e}")
-            return {"measurements": [], "dates": [], "time_periods": [], "comparison_terms": [], "numbers": []}
+            "numbers": list(map(float, _NUMBER_PATTERN.findall(query)))
+        }
     
     def _enhance_query(self, query: str, query_type: str, entities: Dict[str, Any]) -> List[str]:
         """
@@ -240,63 +544,25 @@ class QueryProcessor:
         Returns:
             List of enhanced queries
         """
-        try:
-            enhanced_queries = [query]
-            
-            # Add measurement-specific queries
-            if entities["measurements"]:
-                for measurement in entities["measurements"]:
-                    category = measurement["category"]
-                    keyword = measurement["keyword"]
-                    
-                    if query_type == "trend":
-                        enhanced_queries.append(f"{keyword} trend over time")
-                        enhanced_queries.append(f"{keyword} changes progress")
-                    
-                    elif query_type == "comparison":
-                        enhanced_queries.append(f"{keyword} comparison")
-                        enhanced_queries.append(f"{keyword} difference")
-                    
-                    elif query_type == "specific":
-                        enhanced_queries.append(f"{keyword} measurements")
-                        enhanced_queries.append(f"current {keyword}")
-            
-            # Add time-based enhancements
-            if entities["time_periods"]:
-                for period in entities["time_periods"]:
-                    if query_type == "trend":
-                        enhanced_queries.append(f"trend over {period['value']} {period['type']}s")
-                        enhanced_queries.append(f"changes in last {period['value']} {period['type']}s")
-            
-            # Add summary enhancements
-            if query_type == "summary":
-                enhanced_queries.extend([
-                    "fitness data summary",
-                    "overall statistics",
-                    "complete measurements overview"
-                ])
-            
-            # Add goal-related enhancements
-            if query_type == "goal":
-                enhanced_queries.extend([
-                    "progress toward goals",
-                    "achievement analysis",
-                    "performance evaluation"
-                ])
-            
-            # Remove duplicates while preserving order
-            seen = set()
-            unique_queries = []
-            for q in enhanced_queries:
-                if q not in seen:
-                    seen.add(q)
-                    unique_queries.append(q)
-            
-            return unique_queries
-            
-        except Exception as e:
-            print(f"❌ Error enhancing query: {e}")
-            return [query]
+        enhanced_queries = [query]
+        
+        # Add measurement-specific queries
+        templates = _MEASUREMENT_QUERY_TEMPLATES.get(query_type)
+        if templates:
+            for measurement in entities["measurements"]:
+                enhanced_queries.extend(template.format(measurement["keyword"]) for template in templates)
+        
+        # Add time-based enhancements
+        if query_type == "trend":
+            for period in entities["time_periods"]:
+                enhanced_queries.append(f"trend over {period['value']} {period['type']}s")
+                enhanced_queries.append(f"changes in last {period['value']} {period['type']}s")
+        
+        # Add summary and goal-related enhancements
+        enhanced_queries.extend(_QUERY_TYPE_ENHANCEMENTS.get(query_type, ()))
+        
+        # Remove duplicates while preserving order
+        return list(dict.fromkeys(enhanced_queries))
     
     def _build_filter_criteria(self, query_type: str, entities: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         """
@@ -326,22 +592,16 @@ class QueryProcessor:
             
             # Add time period filters
             if entities["time_periods"] and query_type in ["trend", "comparison"]:
-                # Calculate date range based on time periods
-                end_date = datetime.now()
-                for period in entities["time_periods"]:
-                    if period["type"] == "week":
-                        start_date = end_date - timedelta(weeks=period["value"])
-                    elif period["type"] == "month":
-                        start_date = end_date - timedelta(days=period["value"] * 30)
-                    elif period["type"] == "year":
-                        start_date = end_date - timedelta(days=period["value"] * 365)
-                    else:
-                        start_date = end_date - timedelta(days=period["value"])
-                    
-                    filter_criteria["date"] = {
-                        "$gte": start_date.strftime("%Y-%m-%d"),
-                        "$lte": end_date.strftime("%Y-%m-%d")
-                    }
+                # Calculate date range based on the last time period mentioned
+                period = entities["time_periods"][-1]
+                start_date, end_date = _period_date_range(
+                    _PERIOD_DAYS.get(period["type"], 1) * period["value"], date.today().toordinal()
+                )
+                
+                filter_criteria["date"] = {
+                    "$gte": start_date,
+                    "$lte": end_date
+                }
             
             return filter_criteria if filter_criteria else None
             
@@ -364,26 +624,15 @@ class QueryProcessor:
             normalized = query.lower()
             
             # Remove extra whitespace
-            normalized = re.sub(r'\s+', ' ', normalized)
+            normalized = _WHITESPACE_PATTERN.sub(' ', normalized)
             
             # Remove punctuation (keep some important ones)
-            normalized = re.sub(r'[^\w\s\-]', ' ', normalized)
+            normalized = _PUNCTUATION_PATTERN.sub(' ', normalized)
             
             # Normalize common variations
-            replacements = {
-                'weight': 'weight',
-                'fat %': 'fat_percent',
-                'fat percent': 'fat_percent',
-                'body mass index': 'bmi',
-                'body fat': 'fat_percent',
-                'vs': 'versus',
-                'wk': 'week',
-                'mo': 'month',
-                'yr': 'year'
-            }
-            
-            for old, new in replacements.items():
-                normalized = normalized.replace(old, new)
+            normalized = _NORMALIZE_PATTERN.sub(
+                lambda match: _NORMALIZE_REPLACEMENTS[match.group()], normalized
+            )
             
             return normalized.strip()
             
@@ -476,21 +725,8 @@ class QueryProcessor:
         Returns:
             List of explicit dates found
         """
-        dates = []
-        
-        # Date patterns
-        patterns = [
-            r'\d{4}-\d{2}-\d{2}',  # YYYY-MM-DD
-            r'\d{1,2}/\d{1,2}/\d{4}',  # MM/DD/YYYY or DD/MM/YYYY
-            r'\d{1,2}-\d{1,2}-\d{4}',  # MM-DD-YYYY or DD-MM-YYYY
-            r'\d{1,2}\.\d{1,2}\.\d{4}',  # MM.DD.YYYY or DD.MM.YYYY
-        ]
-        
-        for pattern in patterns:
-            matches = re.findall(pattern, query)
-            dates.extend(matches)
-        
-        return list(set(dates))  # Remove duplicates
+        # Remove duplicates, keeping the order dates appear in
+        return list(dict.fromkeys(_EXPLICIT_DATE_PATTERN.findall(query)))
     
     def _extract_relative_ranges(self, query: str) -> List[Dict[str, str]]:
         """
@@ -505,25 +741,12 @@ class QueryProcessor:
         ranges = []
         query_lower = query.lower()
         
-        # Relative time patterns
-        relative_patterns = {
-            'this_week': r'(this\s+week|current\s+week|past\s+7\s+days)',
-            'last_week': r'(last\s+week|previous\s+week|past\s+week)',
-            'this_month': r'(this\s+month|current\s+month|past\s+30\s+days)',
-            'last_month': r'(last\s+month|previous\s+month|past\s+month)',
-            'this_year': r'(this\s+year|current\s+year|past\s+year)',
-            'last_year': r'(last\s+year|previous\s+year|past\s+year)',
-            'yesterday': r'(yesterday|day\s+before)',
-            'today': r'(today|current\s+day)',
-            'tomorrow': r'(tomorrow|next\s+day)'
-        }
-        
-        for range_name, pattern in relative_patterns.items():
-            if re.search(pattern, query_lower):
+        for range_name, pattern in _RELATIVE_PATTERNS.items():
+            if pattern.search(query_lower):
                 ranges.append({
                     'type': 'relative',
                     'range': range_name,
-                    'pattern': pattern
+                    'pattern': pattern.pattern
                 })
         
         return ranges
@@ -538,43 +761,26 @@ class QueryProcessor:
         Returns:
             List of month ranges
         """
-        ranges = []
-        query_lower = query.lower()
+        # Range types mentioned for each month, from one scan of the query
+        month_types = {}
+        for prefix, month_name in _MONTH_CONTEXT_PATTERN.findall(query.lower()):
+            month_types.setdefault(month_name, set()).add(_MONTH_PREFIX_TYPES[prefix])
         
-        # Month patterns
-        months = {
-            'january': '01', 'february': '02', 'march': '03', 'april': '04',
-            'may': '05', 'june': '06', 'july': '07', 'august': '08',
-            'september': '09', 'october': '10', 'november': '11', 'december': '12'
-        }
+        ranges = []
         
-        # Look for month mentions
-        for month_name, month_num in months.items():
-            if month_name in query_lower:
-                # Check for "until end of [month]" pattern
-                if f'until end of {month_name}' in query_lower or f'till end of {month_name}' in query_lower:
-                    ranges.append({
-                        'type': 'month_end',
-                        'month': month_name,
-                        'month_num': month_num,
-                        'pattern': f'until end of {month_name}'
-                    })
-                # Check for "in [month]" pattern
-                elif f'in {month_name}' in query_lower:
-                    ranges.append({
-                        'type': 'month_period',
-                        'month': month_name,
-                        'month_num': month_num,
-                        'pattern': f'in {month_name}'
-                    })
-                # Check for "since [month]" pattern
-                elif f'since {month_name}' in query_lower:
-                    ranges.append({
-                        'type': 'month_since',
-                        'month': month_name,
-                        'month_num': month_num,
-                        'pattern': f'since {month_name}'
-                    })
+        # One range per month, in calendar order; "until end of" takes precedence
+        # over "in", which takes precedence over "since"
+        for month_name, month_num in _MONTHS.items():
+            types = month_types.get(month_name)
+            if not types:
+                continue
+            range_type = next(range_type for range_type in _MONTH_RANGE_TYPES if range_type in types)
+            ranges.append({
+                'type': range_type,
+                'month': month_name,
+                'month_num': month_num,
+                'pattern': f'{_MONTH_RANGE_PREFIXES[range_type]} {month_name}'
+            })
         
         return ranges
     
@@ -591,16 +797,10 @@ class QueryProcessor:
         ranges = []
         query_lower = query.lower()
         
-        # Seasonal patterns
-        seasons = {
-            'spring': {'start_month': '03', 'end_month': '05'},
-            'summer': {'start_month': '06', 'end_month': '08'},
-            'autumn': {'start_month': '09', 'end_month': '11'},
-            'fall': {'start_month': '09', 'end_month': '11'},
-            'winter': {'start_month': '12', 'end_month': '02'}
-        }
+        if not _ANY_SEASON_PATTERN.search(query_lower):
+            return ranges
         
-        for season_name, season_data in seasons.items():
+        for season_name, season_data in _SEASONS.items():
             if season_name in query_lower:
                 ranges.append({
                     'type': 'seasonal',
@@ -634,18 +834,14 @@ class QueryProcessor:
                 parsed_ranges['explicit'] = []
                 for date_str in date_ranges['explicit_dates']:
                     try:
-                        # Try different date formats
-                        for fmt in ['%Y-%m-%d', '%m/%d/%Y', '%d/%m/%Y', '%m-%d-%Y', '%d-%m-%Y']:
-                            try:
-                                parsed_date = datetime.strptime(date_str, fmt)
-                                parsed_ranges['explicit'].append({
-                                    'original': date_str,
-                                    'parsed': parsed_date,
-                                    'format': fmt
-                                })
-                                break
-                            except ValueError:
-                                continue
+                        parsed = _parse_explicit_date(date_str)
+                        if parsed:
+                            parsed_date, fmt = parsed
+                            parsed_ranges['explicit'].append({
+                                'original': date_str,
+                                'parsed': parsed_date,
+                                'format': fmt
+                            })
                     except Exception as e:
                         print(f"Error parsing explicit date {date_str}: {e}")
             
@@ -747,24 +943,20 @@ class QueryProcessor:
             
             # Parse seasonal ranges
             if date_ranges.get('seasonal_ranges'):
-                parsed_ranges['seasonal'] = []
+                seasonal = parsed_ranges['seasonal'] = []
+                current_year = current_date.year
                 for range_info in date_ranges['seasonal_ranges']:
-                    current_year = current_date.year
                     start_month = int(range_info['start_month'])
                     end_month = int(range_info['end_month'])
                     
                     start_date = datetime(current_year, start_month, 1)
                     
-                    if end_month < start_month:  # Crosses year boundary (winter)
-                        end_date = datetime(current_year + 1, end_month, 1)
-                        if end_month == 2:
-                            end_date = datetime(current_year + 1, 3, 1) - timedelta(days=1)
-                        else:
-                            end_date = datetime(current_year + 1, end_month + 1, 1) - timedelta(days=1)
-                    else:
-                        end_date = datetime(current_year, end_month + 1, 1) - timedelta(days=1)
+                    # Season ends on the last day of its end month, next year if it
+                    # crosses the year boundary (winter)
+                    end_year = current_year + 1 if end_month < start_month else current_year
+                    end_date = datetime(end_year, end_month, calendar.monthrange(end_year, end_month)[1])
                     
-                    parsed_ranges['seasonal'].append({
+                    seasonal.append({
                         'season': range_info['season'],
                         'start_date': start_date,
                         'end_date': end_date,
@@ -787,43 +979,52 @@ class QueryProcessor:
         Returns:
             List of suggested queries
         """
-        try:
-            suggestions = []
-            partial = partial_query.lower().strip()
-            
-            # Common fitness query patterns
-            common_patterns = [
-                "How has my weight changed",
-                "Show me my fat percentage trends",
-                "What's my BMI progression",
-                "Compare my measurements from week",
-                "Give me a summary of my fitness journey",
-                "What are my current body measurements",
-                "Am I making progress toward my goals",
-                "Show me my chest measurements",
-                "What was my weight on",
-                "How did my body composition change"
-            ]
-            
-            # Filter suggestions based on partial query
-            for pattern in common_patterns:
-                if partial in pattern.lower():
-                    suggestions.append(pattern)
-            
-            # Add measurement-specific suggestions
-            for category, keywords in self.measurement_keywords.items():
-                for keyword in keywords:
-                    if keyword in partial:
-                        suggestions.extend([
-                            f"Show me my {keyword} trends",
-                            f"What's my current {keyword}",
-                            f"Compare my {keyword} over time"
-                        ])
-            
-            # Remove duplicates and limit results
-            unique_suggestions = list(dict.fromkeys(suggestions))
-            return unique_suggestions[:10]
+        if not isinstance(partial_query, str):
+            return []
+        
+        partial = partial_query.lower().strip()
+        
+        # Empty or single-character input matches nearly every pattern
+        if len(partial) < 2:
+            return []
+        
+        # Autocomplete repeats the same partial queries as users type
+        cached = self._suggestion_cache.get(partial)
+        if cached is None:
+            cached = tuple(self._generate_suggestions(partial))
+            if len(self._suggestion_cache) >= self._suggestion_cache_size:
+                self._suggestion_cache.popitem(last=False)
+            self._suggestion_cache[partial] = cached
+        
+        return list(cached)
+    
+    def _generate_suggestions(self, partial: str) -> List[str]:
+        """
+        Generate query suggestions for a normalized partial query
+        
+        Args:
+            partial: Stripped, lowercased partial query
             
-        except Exception as e:
-            print(f"❌ Error getting query suggestions: {e}")
-            return [] 
\ No newline at end of file
+        Returns:
+            List of up to _MAX_SUGGESTIONS unique suggestions
+        """
+        # Ordered set of unique suggestions; returned as soon as it is full
+        suggestions = {}
+        
+        # Filter suggestions based on partial query
+        for pattern, pattern_lower in _COMMON_QUERY_PATTERNS:
+            if partial in pattern_lower:
+                suggestions[pattern] = None
+                if len(suggestions) == _MAX_SUGGESTIONS:
+                    return list(suggestions)
+        
+        # Add measurement-specific suggestions
+        for keyword, keyword_suggestions in self._keyword_suggestions:
+            if keyword in partial:
+                for suggestion in keyword_suggestions:
+                    if suggestion not in suggestions:
+                        suggestions[suggestion] = None
+                        if len(suggestions) == _MAX_SUGGESTIONS:
+                            return list(suggestions)
+        
+        return list(suggestions)
\ No newline at end of file
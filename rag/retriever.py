@@ -3,19 +3,104 @@ Retriever Module for RAG Pipeline
 Handles semantic search and context retrieval from vector database
 """
 
+import copy
+import heapq
+import re
+import threading
+from operator import eq, ge, gt, itemgetter, le, lt, ne
+from datetime import date, datetime
 from typing import List, Dict, Any, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
-from .vector_store import VectorStore
+from rank_bm25 import BM25Okapi
+from .vector_store import VectorStore, UNDATED_DATE_ORDINAL
 from .query_processor import QueryProcessor
-from .utils.embeddings import EmbeddingManager
 
 
+# Long-lived thread pool for concurrent searches, shared by retrievers unless one is
+# passed in, so retrievals never pay thread start-up; workers are joined at interpreter exit
+_RETRIEVAL_EXECUTOR = ThreadPoolExecutor(max_workers=8, thread_name_prefix="retriever")
+
+# Date patterns found in result content, each paired with the format that validates it
+_RESULT_DATE_PATTERNS = (
+    (re.compile(r'\d{4}-\d{2}-\d{2}'), '%Y-%m-%d'),  # YYYY-MM-DD
+    (re.compile(r'\d{1,2}/\d{1,2}/\d{4}'), '%m/%d/%Y'),  # MM/DD/YYYY
+    (re.compile(r'\d{1,2}-\d{1,2}-\d{4}'), '%m-%d-%Y'),  # MM-DD-YYYY
+)
+# Formats of the 'date' metadata written by data preparation
+_METADATA_DATE_FORMATS = ('%d-%m-%Y', '%Y-%m-%d')
+_WEEK_NUMBER_PATTERN = re.compile(r'Week (\d+) \((\d+)\)')
+# Relevance multiplier for a (query type, result type) match
+_QUERY_TYPE_BOOSTS = {
+    ('trend', 'trend'): 1.2,
+    ('trend', 'monthly_summary'): 1.2,
+    ('comparison', 'trend'): 1.1,
+    ('specific', 'measurement'): 1.15,
+    ('summary', 'overall_summary'): 1.3,
+}
+_TOKEN_PATTERN = re.compile(r'[a-z0-9]+(?:\.\d+)?')
+# ChromaDB where-clause operators, for filtering documents outside the vector store
+_FILTER_OPERATORS = {
+    '$eq': eq,
+    '$ne': ne,
+    '$gt': gt,
+    '$gte': ge,
+    '$lt': lt,
+    '$lte': le,
+    '$in': lambda value, options: value in options,
+    '$nin': lambda value, options: value not in options,
+}
+
+
+def _tokenize(text: str) -> List[str]:
+    """
+    Split text into lowercase word and number tokens for keyword search
+    
+    Args:
+        text: Text to tokenize
+        
+    Returns:
+        List of tokens
+    """
+    return _TOKEN_PATTERN.findall(text.lower())
+
+
+def _sortable_period(metadata: Dict[str, Any]) -> Any:
+    """
+    Get a value that orders results by week or date, most recent last
+    
+    Args:
+        metadata: Result metadata
+        
+    Returns:
+        "YYYYWW" or "YYYYMMDD" string, or the raw week/date value as a fallback
+    """
+    week_number = metadata.get('week_number', '')
+    
+    # Extract week number for sorting (e.g., "Week 3 (2024)" -> 202403)
+    if week_number and isinstance(week_number, str) and 'Week' in week_number:
+        match = _WEEK_NUMBER_PATTERN.search(week_number)
+        if match:
+            week, year = match.groups()
+            return f"{year}{int(week):02d}"
+    
+    # Fallback to date if week number not available
+    date_str = metadata.get('date', '')
+    if date_str and isinstance(date_str, str) and '-' in date_str:
+        parts = date_str.split('-')
+        if len(parts) == 3:
+            day, month, year = parts
+            return f"{year}{month.zfill(2)}{day.zfill(2)}"
+    
+    return week_number or date_str
+
 class Retriever:
     """Handles semantic search and context retrieval for fitness data"""
     
     def __init__(self, vector_store: VectorStore, 
                  query_processor: QueryProcessor = None,
-                 embedding_provider: str = "sentence-transformers"):
+                 embedding_provider: str = "sentence-transformers",
+                 executor: ThreadPoolExecutor = None):
         """
         Initialize retriever
         
@@ -23,15 +108,39 @@ class Retriever:
             vector_store: Vector store instance
             query_processor: Query processor instance (optional)
             embedding_provider: Embedding provider to use
+            executor: Thread pool for concurrent searches (defaults to the shared pool)
         """
         self.vector_store = vector_store
         self.query_processor = query_processor or QueryProcessor(embedding_provider)
-        self.embedding_manager = EmbeddingManager(embedding_provider)
+        self.executor = executor or _RETRIEVAL_EXECUTOR
+        
+        # Semantic cache of recent retrievals: one normalized query embedding per
+        # slot in a matrix, so a lookup is a single matrix-vector product
+        self._query_cache_matrix: Optional[np.ndarray] = None
+        self._query_cache_entries: List[Tuple[Any, List[Dict[str, Any]]]] = []
+        self._query_cache_last_used = np.zeros(0, dtype=np.int64)
+        self._query_cache_clock = 0
+        self._query_cache_collection_state = None
+        self._query_cache_lock = threading.Lock()
+        self.query_cache_size = 256
+        self.query_cache_threshold = 0.95
+        
+        # BM25 index over the collection, built on first keyword search
+        self._bm25_index = None
+        self._bm25_documents: List[Dict[str, Any]] = []
+        self._bm25_collection_state = None
+        self._bm25_lock = threading.Lock()
         
         # Retrieval parameters
         self.default_n_results = 5
         self.max_n_results = 20
         self.min_similarity_threshold = 0.1
+        self.dedup_similarity_threshold = 0.95
+    
+    @property
+    def embedding_manager(self):
+        """Embedding manager of the query processor, so one model serves both"""
+        return self.query_processor.embedding_manager
     
     def retrieve(self, query: str, n_results: int = None, 
                 filter_criteria: Optional[Dict[str, Any]] = None,
@@ -65,97 +174,330 @@ class Retriever:
             # Extract date ranges for filtering
             date_ranges = self.query_processor.extract_date_ranges(query)
             
+            # Reuse results of an earlier, near-identical query with the same dates, entities and filters
+            query_embedding = self._normalize_query_embedding(processed_query.get('embedding'))
+            cache_context = (
+                n_results, repr(filter_criteria), use_enhanced_queries,
+                processed_query.get('query_type'), repr(processed_query.get('entities')),
+                tuple(self._date_range_bounds(date_ranges))
+            )
+            if query_embedding is not None:
+                cached_results = self._lookup_query_cache(query_embedding, cache_context)
+                if cached_results is not None:
+                    return cached_results
+            
             # Build enhanced filter criteria with date ranges
             enhanced_filter_criteria = self._build_enhanced_filters(
                 filter_criteria, date_ranges, processed_query
             )
             
-            # Simplify filter criteria for ChromaDB compatibility
-            if enhanced_filter_criteria and isinstance(enhanced_filter_criteria, dict):
-                # Remove complex filter structures that ChromaDB can't handle
-                simplified_filters = {}
-                for key, value in enhanced_filter_criteria.items():
-                    if isinstance(value, (str, int, float, bool)):
-                        simplified_filters[key] = value
-                    elif isinstance(value, list) and all(isinstance(v, (str, int, float, bool)) for v in value):
-                        simplified_filters[key] = value
-                enhanced_filter_criteria = simplified_filters if simplified_filters else None
+            # Whether the vector store applies the date range, making the Python filter redundant
+            date_filtered_by_store = bool(enhanced_filter_criteria) and 'date_ordinal' in enhanced_filter_criteria
             
             # Perform retrieval with fallback
-            results = []
-            try:
-                if use_enhanced_queries and processed_query.get("enhanced_queries"):
-                    results = self._retrieve_with_enhanced_queries(
-                        processed_query, n_results, enhanced_filter_criteria
-                    )
-                else:
-                    results = self._retrieve_single_query(
-                        query, n_results, enhanced_filter_criteria
-                    )
-            except Exception as e:
-                print(f"⚠️ Enhanced retrieval failed: {e}")
-                # Fallback to simple retrieval without filters
-                try:
-                    results = self._retrieve_single_query(query, n_results, None)
-                except Exception as fallback_error:
-                    print(f"❌ Fallback retrieval also failed: {fallback_error}")
-                    results = []
+            results, filters_applied = self._search_with_fallback(
+                query, processed_query, n_results,
+                self._to_store_filter(enhanced_filter_criteria), use_enhanced_queries
+            )
+            date_filtered_by_store = date_filtered_by_store and filters_applied
+            
+            # Nothing in the date range: search again with every other filter, and let the
+            # Python filter keep its behaviour of returning all results when none match
+            if date_filtered_by_store and not results:
+                undated_filter_criteria = {
+                    key: value for key, value in enhanced_filter_criteria.items() if key != 'date_ordinal'
+                }
+                results, _ = self._search_with_fallback(
+                    query, processed_query, n_results,
+                    self._to_store_filter(undated_filter_criteria), use_enhanced_queries
+                )
+                date_filtered_by_store = False
             
             # Filter results based on date ranges
-            filtered_results = self._filter_results_by_date_ranges(
-                results, date_ranges, processed_query
-            )
+            if date_filtered_by_store:
+                filtered_results = results
+            else:
+                filtered_results = self._filter_results_by_date_ranges(
+                    results, date_ranges, processed_query
+                )
             
             # Post-process results
             processed_results = self._post_process_results(filtered_results, processed_query)
             
+            if query_embedding is not None and processed_results:
+                self._store_query_cache(query_embedding, cache_context, processed_results)
+            
             return processed_results
             
         except Exception as e:
             print(f"❌ Error in retrieval: {e}")
             return []
     
-    def _retrieve_with_enhanced_queries(self, processed_query: Dict[str, Any], 
-                                      n_results: int, 
-                                      filter_criteria: Optional[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    @staticmethod
+    def _to_store_filter(enhanced_filter_criteria: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
         """
-        Retrieve using enhanced queries for better results
+        Simplify filter criteria into a ChromaDB where clause
         
         Args:
+            enhanced_filter_criteria: Filter criteria built for the query
+            
+        Returns:
+            Where clause, or None if nothing can be filtered by the store
+        """
+        if not enhanced_filter_criteria or not isinstance(enhanced_filter_criteria, dict):
+            return None
+        
+        # Remove complex filter structures that ChromaDB can't handle
+        conditions = []
+        for key, value in enhanced_filter_criteria.items():
+            if isinstance(value, (str, int, float, bool)):
+                conditions.append({key: value})
+            elif isinstance(value, list) and all(isinstance(v, (str, int, float, bool)) for v in value):
+                conditions.append({key: value})
+            elif isinstance(value, dict) and value and value.keys() <= _FILTER_OPERATORS.keys():
+                # ChromaDB allows one operator per condition, so split ranges
+                bounds = [{key: {op: bound}} for op, bound in value.items()]
+                if key == 'date_ordinal':
+                    # Trends and summaries have no single date and always pass date filters
+                    in_range = {'$and': bounds} if len(bounds) > 1 else bounds[0]
+                    conditions.append({'$or': [{key: UNDATED_DATE_ORDINAL}, in_range]})
+                else:
+                    conditions.extend(bounds)
+        
+        # ChromaDB needs several conditions combined explicitly
+        if len(conditions) > 1:
+            return {'$and': conditions}
+        
+        return conditions[0] if conditions else None
+    
+    def _search_with_fallback(self, query: str, processed_query: Dict[str, Any], n_results: int,
+                              store_filter: Optional[Dict[str, Any]],
+                              use_enhanced_queries: bool) -> Tuple[List[Dict[str, Any]], bool]:
+        """
+        Search with the given filter, falling back to an unfiltered search on failure
+        
+        Args:
+            query: Query string
             processed_query: Processed query information
-            n_results: Number of results to return
-            filter_criteria: Filter criteria
+            n_results: Number of results
+            store_filter: ChromaDB where clause
+            use_enhanced_queries: Whether to use enhanced queries
             
         Returns:
-            List of retrieved documents
+            Tuple of (results, whether the filter was applied)
         """
         try:
-            all_results = []
-            enhanced_queries = processed_query.get("enhanced_queries", [])
-            
-            # Retrieve for each enhanced query
-            for enhanced_query in enhanced_queries:
+            if use_enhanced_queries and processed_query.get("enhanced_queries"):
+                results = self._retrieve_with_enhanced_queries(
+                    processed_query, n_results, store_filter
+                )
+            else:
                 results = self._retrieve_single_query(
-                    enhanced_query, 
-                    n_results * 2,  # Get more results to allow for deduplication
-                    filter_criteria
+                    query, n_results, store_filter
                 )
-                all_results.extend(results)
+            return results, True
+        except Exception as e:
+            print(f"⚠️ Enhanced retrieval failed: {e}")
+            # Fallback to simple retrieval without filters
+            try:
+                return self._retrieve_single_query(query, n_results, None), False
+            except Exception as fallback_error:
+                print(f"❌ Fallback retrieval also failed: {fallback_error}")
+                return [], False
+    
+    @staticmethod
+    def _normalize_query_embedding(embedding: Optional[List[float]]) -> Optional[np.ndarray]:
+        """
+        Get the unit-length query embedding for semantic cache lookups
+        
+        Args:
+            embedding: Query embedding computed by the query processor
+            
+        Returns:
+            Normalized float32 embedding, or None if the query was not embedded
+        """
+        if embedding is None or len(embedding) == 0:
+            return None
+        
+        embedding = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(embedding)
+        if embedding.ndim != 1 or not norm:
+            return None
+        
+        return embedding / norm
+    
+    def _collection_state(self) -> Tuple[Any, int]:
+        """Write version and size of the collection, which change whenever its documents do"""
+        # The count also catches writes made through other VectorStore instances
+        return self.vector_store.get_version(), self.vector_store.get_document_count()
+    
+    @staticmethod
+    def _date_range_bounds(date_ranges: Dict[str, Any]) -> List[Tuple[int, int]]:
+        """
+        Convert parsed date ranges to inclusive day-ordinal bounds
+        
+        Relative ranges are computed from the current time, so ordinals also
+        give a key that stays stable for queries asked on the same day.
+        
+        Args:
+            date_ranges: Extracted date ranges
+            
+        Returns:
+            List of (start ordinal, end ordinal) tuples; explicit dates have start == end
+        """
+        if not date_ranges or date_ranges.get('error'):
+            return []
+        
+        bounds = []
+        for _, ranges in sorted(date_ranges.get('parsed_ranges', {}).items()):
+            for range_info in ranges:
+                if 'parsed' in range_info:
+                    date_ordinal = range_info['parsed'].toordinal()
+                    bounds.append((date_ordinal, date_ordinal))
+                else:
+                    bounds.append((range_info['start_date'].toordinal(), range_info['end_date'].toordinal()))
+        
+        return bounds
+    
+    def _lookup_query_cache(self, query_embedding: np.ndarray,
+                            cache_context: Tuple) -> Optional[List[Dict[str, Any]]]:
+        """
+        Find cached results for a semantically equivalent query
+        
+        Args:
+            query_embedding: Normalized query embedding
+            cache_context: Parameters that must match exactly for a hit
+            
+        Returns:
+            Cached results, or None on a miss
+        """
+        with self._query_cache_lock:
+            if not self._query_cache_entries:
+                return None
             
-            # Deduplicate and rank results
-            unique_results = self._deduplicate_results(all_results)
+            # Cached results are stale once documents are added, updated, or removed
+            if self._collection_state() != self._query_cache_collection_state:
+                self._clear_query_cache()
+                return None
             
-            # Sort by score and take top results
-            sorted_results = sorted(unique_results, key=lambda x: x.get('score', 0), reverse=True)
+            size = len(self._query_cache_entries)
+            similarities = self._query_cache_matrix[:size] @ query_embedding
             
-            return sorted_results[:n_results]
+            candidates = np.flatnonzero(similarities >= self.query_cache_threshold)
+            for slot in candidates[np.argsort(-similarities[candidates])]:
+                context, results = self._query_cache_entries[slot]
+                if context == cache_context:
+                    self._query_cache_clock += 1
+                    self._query_cache_last_used[slot] = self._query_cache_clock
+                    # Callers may mutate result dicts, so never hand out the cached ones
+                    return copy.deepcopy(results)
             
-        except Exception as e:
-            print(f"❌ Error in enhanced query retrieval: {e}")
-            return []
+            return None
+    
+    def _store_query_cache(self, query_embedding: np.ndarray, cache_context: Tuple,
+                           results: List[Dict[str, Any]]):
+        """
+        Cache retrieval results, evicting the least recently used entry when full
+        
+        Args:
+            query_embedding: Normalized query embedding
+            cache_context: Parameters that must match exactly for a hit
+            results: Results to cache
+        """
+        with self._query_cache_lock:
+            if self._query_cache_matrix is None or self._query_cache_matrix.shape[1] != query_embedding.shape[0]:
+                self._query_cache_matrix = np.zeros(
+                    (self.query_cache_size, query_embedding.shape[0]), dtype=np.float32
+                )
+                self._query_cache_last_used = np.zeros(self.query_cache_size, dtype=np.int64)
+                self._query_cache_entries = []
+            
+            if not self._query_cache_entries:
+                self._query_cache_collection_state = self._collection_state()
+            
+            if len(self._query_cache_entries) < self.query_cache_size:
+                slot = len(self._query_cache_entries)
+                self._query_cache_entries.append((cache_context, copy.deepcopy(results)))
+            else:
+                slot = int(np.argmin(self._query_cache_last_used))
+                self._query_cache_entries[slot] = (cache_context, copy.deepcopy(results))
+            
+            self._query_cache_matrix[slot] = query_embedding
+            self._query_cache_clock += 1
+            self._query_cache_last_used[slot] = self._query_cache_clock
+    
+    def _clear_query_cache(self):
+        """Drop all semantic cache entries (caller holds the cache lock)"""
+        self._query_cache_entries = []
+        self._query_cache_collection_state = None
+    
+    def _retrieve_with_enhanced_queries(self, processed_query: Dict[str, Any], 
+                                      n_results: int, 
+                                      filter_criteria: Optional[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Retrieve using enhanced queries for better results
+        
+        Args:
+            processed_query: Processed query information
+            n_results: Number of results to return
+            filter_criteria: Filter criteria
+            
+        Returns:
+            List of retrieved documents
+        """
+        enhanced_queries = processed_query.get("enhanced_queries", [])
+        
+        # Embed all enhanced queries in one batch; the collection uses the same
+        # sentence-transformers model, so the searches need not re-embed them
+        embeddings = []
+        if self.embedding_manager.provider != "openai":
+            embeddings = self.query_processor.get_query_embeddings(enhanced_queries)
+        
+        if len(embeddings) == len(enhanced_queries):
+            search, search_inputs = self.vector_store.search_by_embedding, embeddings
+        else:
+            search, search_inputs = self._retrieve_single_query, enhanced_queries
+        
+        # Retrieve for each enhanced query concurrently; searches are I/O-bound
+        futures = [
+            self.executor.submit(
+                search,
+                search_input,
+                n_results * 2,  # Get more results to allow for deduplication
+                filter_criteria,
+                include_embeddings=True
+            )
+            for search_input in search_inputs
+        ]
+        
+        # Deduplicate each search's results as it arrives and keep only the best
+        # n_results in a min-heap. Entries are (score, -arrival, result), so among
+        # equal scores the earliest result is kept and ranked first
+        seen_keys, kept_embeddings = set(), {}
+        top_results = []
+        arrival = 0
+        
+        # Collect in submission order so deduplication keeps the same first hit
+        for future in futures:
+            try:
+                batch = future.result()
+            except Exception as e:
+                print(f"⚠️ Enhanced query retrieval failed: {e}")
+                continue
+            
+            for result in self._deduplicate_batch(batch, seen_keys, kept_embeddings):
+                arrival += 1
+                entry = (result.get('score', 0), -arrival, result)
+                if len(top_results) < n_results:
+                    heapq.heappush(top_results, entry)
+                elif top_results and entry[:2] > top_results[0][:2]:
+                    heapq.heapreplace(top_results, entry)
+        
+        return [result for _, _, result in sorted(top_results, key=itemgetter(0, 1), reverse=True)]
     
     def _retrieve_single_query(self, query: str, n_results: int, 
-                             filter_criteria: Optional[Dict[str, Any]]) -> List[Dict[str, Any]]:
+                             filter_criteria: Optional[Dict[str, Any]],
+                             include_embeddings: bool = False) -> List[Dict[str, Any]]:
         """
         Retrieve for a single query
         
@@ -163,29 +505,29 @@ class Retriever:
             query: Query string
             n_results: Number of results
             filter_criteria: Filter criteria
+            include_embeddings: Whether to return document embeddings
             
         Returns:
             List of retrieved documents
         """
-        try:
-            # Perform vector search
-            results = self.vector_store.search(
-                query=query,
-                n_results=n_results,
-                filter_dict=filter_criteria
-            )
-            
-            return results
-            
-        except Exception as e:
-            print(f"❌ Error in single query retrieval: {e}")
-            return []
+        # Perform vector search
+        results = self.vector_store.search(
+            query=query,
+            n_results=n_results,
+            filter_dict=filter_criteria,
+            include_embeddings=include_embeddings
+        )
+        
+        return results
     
     def _post_process_results(self, results: List[Dict[str, Any]], 
                             processed_query: Dict[str, Any]) -> List[Dict[str, Any]]:
         """
         Post-process retrieval results
         
+        Results are annotated in place: the vector store builds new result
+        dictionaries for every search, so the retriever owns them here.
+        
         Args:
             results: Raw retrieval results
             processed_query: Processed query information
@@ -193,68 +535,33 @@ class Retriever:
         Returns:
             Post-processed results
         """
-        try:
-            processed_results = []
-            
-            for result in results:
-                # Apply similarity threshold
-                score = result.get('score', 0)
-                if score < self.min_similarity_threshold:
-                    continue
-                
-                # Add query context
-                processed_result = result.copy()
-                processed_result['query_context'] = {
-                    'query_type': processed_query.get('query_type'),
-                    'entities': processed_query.get('entities'),
-                    'original_query': processed_query.get('original_query')
-                }
-                
-                # Calculate relevance score
-                relevance_score = self._calculate_relevance_score(result, processed_query)
-                processed_result['relevance_score'] = relevance_score
-                
-                processed_results.append(processed_result)
-            
-            # Sort by relevance score first, then by date (most recent first)
-            def sort_key(x):
-                relevance = x.get('relevance_score', 0)
-                week_number = x.get('metadata', {}).get('week_number', '')
-                
-                # Extract week number for sorting (e.g., "Week 3 (2024)" -> 202403)
-                try:
-                    if week_number and 'Week' in week_number:
-                        # Parse "Week X (YYYY)" format
-                        import re
-                        match = re.search(r'Week (\d+) \((\d+)\)', week_number)
-                        if match:
-                            week, year = match.groups()
-                            sortable_week = f"{year}{int(week):02d}"
-                            return (relevance, sortable_week)
-                except:
-                    pass
-                
-                # Fallback to date if week number not available
-                date_str = x.get('metadata', {}).get('date', '')
-                try:
-                    if date_str and '-' in date_str:
-                        parts = date_str.split('-')
-                        if len(parts) == 3:
-                            day, month, year = parts
-                            sortable_date = f"{year}{month.zfill(2)}{day.zfill(2)}"
-                            return (relevance, sortable_date)
-                except:
-                    pass
-                
-                return (relevance, week_number or date_str)
+        keyed_results = []
+        query_context = {
+            'query_type': processed_query.get('query_type'),
+            'entities': processed_query.get('entities'),
+            'original_query': processed_query.get('original_query')
+        }
+        
+        for result in results:
+            # Apply similarity threshold
+            score = result.get('score', 0)
+            if score < self.min_similarity_threshold:
+                continue
             
-            processed_results.sort(key=sort_key, reverse=True)
+            # Add query context
+            result['query_context'] = query_context
             
-            return processed_results
+            # Calculate relevance score
+            relevance_score = self._calculate_relevance_score(result, processed_query)
+            result['relevance_score'] = relevance_score
             
-        except Exception as e:
-            print(f"❌ Error in post-processing results: {e}")
-            return results
+            # Sort by relevance score first, then by date (most recent first)
+            sort_key = (relevance_score, _sortable_period(result.get('metadata', {})))
+            keyed_results.append((sort_key, result))
+        
+        keyed_results.sort(key=itemgetter(0), reverse=True)
+        
+        return [result for _, result in keyed_results]
     
     def _calculate_relevance_score(self, result: Dict[str, Any], 
                                  processed_query: Dict[str, Any]) -> float:
@@ -268,41 +575,26 @@ class Retriever:
         Returns:
             Relevance score
         """
-        try:
-            base_score = result.get('score', 0)
-            relevance_score = base_score
-            
-            # Boost score based on query type match
-            query_type = processed_query.get('query_type')
-            metadata = result.get('metadata', {})
-            result_type = metadata.get('type')
-            
-            if query_type and result_type:
-                if query_type == 'trend' and result_type in ['trend', 'monthly_summary']:
-                    relevance_score *= 1.2
-                elif query_type == 'comparison' and result_type == 'trend':
-                    relevance_score *= 1.1
-                elif query_type == 'specific' and result_type == 'measurement':
-                    relevance_score *= 1.15
-                elif query_type == 'summary' and result_type == 'overall_summary':
-                    relevance_score *= 1.3
-            
-            # Boost score based on entity matches
-            entities = processed_query.get('entities', {})
-            measurements = entities.get('measurements', [])
-            
-            if measurements and metadata.get('measurements'):
-                result_measurements = metadata.get('measurements', {})
-                for measurement in measurements:
-                    category = measurement.get('category')
-                    if category in result_measurements:
-                        relevance_score *= 1.1
-            
-            return min(relevance_score, 1.0)  # Cap at 1.0
-            
-        except Exception as e:
-            print(f"❌ Error calculating relevance score: {e}")
-            return result.get('score', 0)
+        base_score = result.get('score', 0)
+        relevance_score = base_score
+        
+        # Boost score based on query type match
+        query_type = processed_query.get('query_type')
+        metadata = result.get('metadata', {})
+        result_type = metadata.get('type')
+        
+        relevance_score *= _QUERY_TYPE_BOOSTS.get((query_type, result_type), 1.0)
+        
+        # Boost score based on entity matches
+        entities = processed_query.get('entities', {})
+        measurements = entities.get('measurements', [])
+        
+        if measurements and metadata.get('measurements'):
+            categories = {measurement.get('category') for measurement in measurements}
+            matches = categories.intersection(metadata['measurements'])
+            relevance_score *= 1.1 ** len(matches)
+        
+        return min(relevance_score, 1.0)  # Cap at 1.0
     
     def _deduplicate_results(self, results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         """
@@ -314,27 +606,62 @@ class Retriever:
         Returns:
             Deduplicated results
         """
-        try:
-            unique_results = []
-            seen_contents = set()
+        return self._deduplicate_batch(results, set(), {})
+    
+    def _deduplicate_batch(self, results: List[Dict[str, Any]], seen_keys: set,
+                           kept_embeddings: Dict[Any, List[np.ndarray]]) -> List[Dict[str, Any]]:
+        """
+        Drop results that duplicate each other or anything kept from earlier batches
+        
+        A result repeating a kept document id is a duplicate. Results carrying an
+        'embedding' are also compared by cosine similarity, but only against kept
+        results with the same metadata date and type: weekly documents share one
+        template, so different weeks embed almost identically. Results without an embedding
+        are compared by their first 100 characters. Results are kept greedily in
+        order, so the first of each group of duplicates wins.
+        
+        Args:
+            results: Batch of results
+            seen_keys: Document ids and content prefixes kept so far (updated in place)
+            kept_embeddings: Normalized embeddings kept so far, by metadata (date, type) (updated in place)
             
-            for result in results:
-                content = result.get('content', '')
-                if not content:
-                    continue
-                
-                # Create a hash of the content for deduplication
-                content_hash = hash(content[:100])  # Use first 100 chars
+        Returns:
+            Deduplicated results, without their embeddings
+        """
+        unique_results = []
+        
+        for result in results:
+            embedding = result.pop('embedding', None)
+            if not result.get('content'):
+                continue
+            
+            doc_id = result.get('id')
+            if doc_id is not None and ('id', doc_id) in seen_keys:
+                continue
+            
+            if embedding is not None:
+                vector = np.asarray(embedding, dtype=np.float32)
+                vector = vector / max(float(np.linalg.norm(vector)), 1e-12)
                 
-                if content_hash not in seen_contents:
-                    seen_contents.add(content_hash)
-                    unique_results.append(result)
-            
-            return unique_results
+                metadata = result.get('metadata') or {}
+                if metadata.get('date') is not None:
+                    same_period = kept_embeddings.setdefault((metadata['date'], metadata.get('type')), [])
+                    if same_period and (np.vstack(same_period) @ vector).max() >= self.dedup_similarity_threshold:
+                        continue
+                    same_period.append(vector)
+            else:
+                # Key on the first 100 chars; str caches its hash, so the
+                # membership test and add hash the prefix only once
+                content_prefix = result['content'][:100]
+                if content_prefix in seen_keys:
+                    continue
+                seen_keys.add(content_prefix)
             
-        except Exception as e:
-            print(f"❌ Error deduplicating results: {e}")
-            return results
+            if doc_id is not None:
+                seen_keys.add(('id', doc_id))
+            unique_results.append(result)
+        
+        return unique_results
     
     def retrieve_by_embedding(self, embedding: List[float], n_results: int = None,
                             filter_criteria: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
@@ -389,19 +716,26 @@ class Retriever:
         try:
             n_results = n_results or self.default_n_results
             
+            # Keyword search runs on the pool while semantic search runs here; retrieve()
+            # submits its own searches to the pool, so it must not occupy a worker itself
+            # Each branch gets its own copy of the filter, as they run in different threads
+            keyword_future = self.executor.submit(
+                self._keyword_search, query, n_results * 2,
+                dict(filter_criteria) if filter_criteria else None
+            )
+            
             # Semantic search
-            semantic_results = self.retrieve(query, n_results * 2, filter_criteria)
+            semantic_results = self.retrieve(
+                query, n_results * 2, dict(filter_criteria) if filter_criteria else None
+            )
             
-            # Keyword search (simple implementation)
-            keyword_results = self._keyword_search(query, n_results * 2, filter_criteria)
+            keyword_results = keyword_future.result()
             
             # Combine results
-            combined_results = self._combine_search_results(
-                semantic_results, keyword_results, semantic_weight
+            return self._combine_search_results(
+                semantic_results, keyword_results, semantic_weight, n_results
             )
             
-            return combined_results[:n_results]
-            
         except Exception as e:
             print(f"❌ Error in hybrid search: {e}")
             return []
@@ -409,31 +743,132 @@ class Retriever:
     def _keyword_search(self, query: str, n_results: int,
                        filter_criteria: Optional[Dict[str, Any]]) -> List[Dict[str, Any]]:
         """
-        Simple keyword-based search
+        BM25 keyword search over the whole collection
         
         Args:
             query: Query string
             n_results: Number of results
-            filter_criteria: Filter criteria
+            filter_criteria: Filter criteria, in ChromaDB where-clause form
             
         Returns:
-            List of keyword search results
+            List of keyword search results, scored relative to the best match
         """
         try:
-            # This is a simplified keyword search
-            # In a real implementation, you might use BM25 or similar
+            query_tokens = _tokenize(query)
+            if not query_tokens:
+                return []
+            
+            bm25_index, documents = self._get_bm25_index()
+            if bm25_index is None:
+                return []
             
-            # For now, just return semantic search results
-            # as a placeholder for keyword search
-            return self.retrieve(query, n_results, filter_criteria, use_enhanced_queries=False)
+            scores = bm25_index.get_scores(query_tokens)
+            
+            # Keep to the dates asked about, as the semantic search does; documents
+            # without a date are kept, and nothing falls back to other dates
+            range_bounds = self._date_range_bounds(self.query_processor.extract_date_ranges(query))
+            
+            keyword_results = []
+            for i in np.argsort(-scores):
+                if scores[i] <= 0 or len(keyword_results) >= n_results:
+                    break
+                
+                document = documents[i]
+                if not self._matches_metadata_filter(document['metadata'], filter_criteria):
+                    continue
+                
+                if range_bounds:
+                    document_date = self._extract_date_from_result(document)
+                    if document_date is not None and not self._date_matches_ranges(
+                        document_date.toordinal(), range_bounds
+                    ):
+                        continue
+                
+                keyword_results.append({**document, 'score': float(scores[i])})
+            
+            # Scale to [0, 1] so the scores can be weighted against semantic scores
+            if keyword_results:
+                top_score = keyword_results[0]['score']
+                for result in keyword_results:
+                    result['score'] /= top_score
+            
+            return keyword_results
             
         except Exception as e:
             print(f"❌ Error in keyword search: {e}")
             return []
     
+    def _get_bm25_index(self) -> Tuple[Optional[BM25Okapi], List[Dict[str, Any]]]:
+        """
+        Get the BM25 index, rebuilding it after any write to the collection
+        
+        Returns:
+            Tuple of (BM25 index or None if the collection is empty, indexed documents)
+        """
+        with self._bm25_lock:
+            collection_state = self._collection_state()
+            
+            if collection_state != self._bm25_collection_state:
+                documents = self.vector_store.get_all_documents()
+                self._bm25_collection_state = collection_state
+                self._bm25_documents = documents
+                self._bm25_index = (
+                    BM25Okapi([_tokenize(document['content'] or '') for document in documents])
+                    if documents else None
+                )
+            
+            return self._bm25_index, self._bm25_documents
+    
+    @staticmethod
+    def _matches_metadata_filter(metadata: Dict[str, Any],
+                                 filter_criteria: Optional[Dict[str, Any]]) -> bool:
+        """
+        Check a document's metadata against a ChromaDB-style where clause
+        
+        Supports plain values, value lists, the comparison operators, and
+        nested '$and' / '$or' clauses, so filters match what the vector store
+        would return. A document missing a filtered key does not match.
+        
+        Args:
+            metadata: Document metadata
+            filter_criteria: Filter criteria
+            
+        Returns:
+            True if the metadata satisfies every condition
+        """
+        if not filter_criteria:
+            return True
+        
+        for key, condition in filter_criteria.items():
+            if key == '$and':
+                if not all(Retriever._matches_metadata_filter(metadata, clause) for clause in condition):
+                    return False
+            elif key == '$or':
+                if not any(Retriever._matches_metadata_filter(metadata, clause) for clause in condition):
+                    return False
+            elif key not in metadata:
+                return False
+            elif isinstance(condition, dict):
+                for op, operand in condition.items():
+                    compare = _FILTER_OPERATORS.get(op)
+                    try:
+                        if compare is None or not compare(metadata[key], operand):
+                            return False
+                    except TypeError:
+                        # Values of different types never match, as in ChromaDB
+                        return False
+            elif isinstance(condition, list):
+                if metadata[key] not in condition:
+                    return False
+            elif metadata[key] != condition:
+                return False
+        
+        return True
+    
     def _combine_search_results(self, semantic_results: List[Dict[str, Any]],
                               keyword_results: List[Dict[str, Any]],
-                              semantic_weight: float) -> List[Dict[str, Any]]:
+                              semantic_weight: float,
+                              n_results: Optional[int] = None) -> List[Dict[str, Any]]:
         """
         Combine semantic and keyword search results
         
@@ -441,68 +876,88 @@ class Retriever:
             semantic_results: Semantic search results
             keyword_results: Keyword search results
             semantic_weight: Weight for semantic search
+            n_results: Number of top results to return (all if None)
             
         Returns:
             Combined results
         """
-        try:
-            combined_scores = {}
-            
-            # Process semantic results
-            for result in semantic_results:
-                doc_id = result.get('id')
-                semantic_score = result.get('score', 0)
-                
-                if doc_id not in combined_scores:
-                    combined_scores[doc_id] = {
-                        'result': result,
-                        'semantic_score': semantic_score,
-                        'keyword_score': 0
-                    }
-                else:
-                    combined_scores[doc_id]['semantic_score'] = max(
-                        combined_scores[doc_id]['semantic_score'], semantic_score
-                    )
-            
-            # Process keyword results
-            for result in keyword_results:
-                doc_id = result.get('id')
-                keyword_score = result.get('score', 0)
-                
-                if doc_id not in combined_scores:
-                    combined_scores[doc_id] = {
-                        'result': result,
-                        'semantic_score': 0,
-                        'keyword_score': keyword_score
-                    }
-                else:
-                    combined_scores[doc_id]['keyword_score'] = max(
-                        combined_scores[doc_id]['keyword_score'], keyword_score
-                    )
-            
-            # Calculate combined scores
-            combined_results = []
-            for doc_id, scores in combined_scores.items():
-                combined_score = (
-                    semantic_weight * scores['semantic_score'] +
-                    (1 - semantic_weight) * scores['keyword_score']
-                )
-                
-                result = scores['result'].copy()
-                result['combined_score'] = combined_score
-                result['semantic_score'] = scores['semantic_score']
-                result['keyword_score'] = scores['keyword_score']
-                
-                combined_results.append(result)
-            
-            # Sort by combined score
-            combined_results.sort(key=lambda x: x.get('combined_score', 0), reverse=True)
+        # Align both score lists on one index per unique document id
+        results_by_id = {}
+        for result in semantic_results:
+            results_by_id.setdefault(result.get('id'), result)
+        semantic_count = len(results_by_id)
+        for result in keyword_results:
+            results_by_id.setdefault(result.get('id'), result)
+        id_to_index = {doc_id: i for i, doc_id in enumerate(results_by_id)}
+        
+        semantic_scores = self._aligned_scores(semantic_results, id_to_index)
+        keyword_scores = self._aligned_scores(keyword_results, id_to_index)
+        
+        # Calculate combined scores
+        combined_scores = semantic_weight * semantic_scores + (1 - semantic_weight) * keyword_scores
+        
+        # Sort by combined score, keeping first-seen order for ties
+        order = self._top_k_order(combined_scores, n_results)
+        
+        combined_results = []
+        unique_results = list(results_by_id.values())
+        for i in order:
+            # Semantic results may be shared with the query cache; keyword results are built per call
+            result = unique_results[i].copy() if i < semantic_count else unique_results[i]
+            result['combined_score'] = float(combined_scores[i])
+            result['semantic_score'] = float(semantic_scores[i])
+            result['keyword_score'] = float(keyword_scores[i])
+            
+            combined_results.append(result)
+        
+        return combined_results
+    
+    @staticmethod
+    def _top_k_order(scores: np.ndarray, k: Optional[int]) -> np.ndarray:
+        """
+        Get indices of the k highest scores, highest first
+        
+        Ties are broken by index, exactly as a stable full sort would.
+        
+        Args:
+            scores: Scores to rank
+            k: Number of indices to return (all if None)
             
-            return combined_results
+        Returns:
+            Array of indices
+        """
+        negated = -scores
+        if k is None or k >= len(scores):
+            return np.argsort(negated, kind='stable')
+        if k <= 0:
+            return np.empty(0, dtype=np.intp)
+        
+        # Partition in O(N), keeping every score tied with the k-th so the
+        # stable sort of the candidates breaks ties the same way
+        kth_value = np.partition(negated, k - 1)[k - 1]
+        candidates = np.flatnonzero(negated <= kth_value)
+        return candidates[np.argsort(negated[candidates], kind='stable')][:k]
+    
+    @staticmethod
+    def _aligned_scores(results: List[Dict[str, Any]], id_to_index: Dict[Any, int]) -> np.ndarray:
+        """
+        Place result scores into an array indexed by document id
+        
+        Args:
+            results: Search results
+            id_to_index: Array index for each document id
             
-        except Exception as e:
-            print(f"❌ Error combining search results: {e}")
-            return semantic_results
+        Returns:
+            Array with the best score per document (0 where it was not found)
+        """
+        scores = np.zeros(len(id_to_index))
+        if results:
+            indices = np.fromiter((id_to_index[result.get('id')] for result in results),
+                                  dtype=np.intp, count=len(results))
+            values = np.fromiter((result.get('score', 0) for result in results),
+                                 dtype=float, count=len(results))
+            np.maximum.at(scores, indices, values)
+        return scores
     
     def _build_enhanced_filters(self, filter_criteria: Optional[Dict[str, Any]], 
                                date_ranges: Dict[str, Any], 
@@ -519,7 +974,8 @@ class Retriever:
             Enhanced filter criteria
         """
         try:
-            enhanced_filters = filter_criteria or {}
+            # Copy so the caller's dict is never changed, as hybrid search shares it across threads
+            enhanced_filters = dict(filter_criteria) if filter_criteria else {}
             
             # Add date range filters if available
             if date_ranges and not date_ranges.get('error'):
@@ -569,6 +1025,15 @@ class Retriever:
                 
                 if date_filters:
                     enhanced_filters['date_filters'] = date_filters
+                
+                # A single date range can be filtered by the vector store itself
+                range_bounds = self._date_range_bounds(date_ranges)
+                if len(range_bounds) == 1 and self.vector_store.has_date_ordinals():
+                    start_ordinal, end_ordinal = range_bounds[0]
+                    enhanced_filters['date_ordinal'] = {
+                        '$gte': start_ordinal,
+                        '$lte': end_ordinal
+                    }
             
             # Add query type specific filters
             query_type = processed_query.get('query_type', 'general')
@@ -595,41 +1060,36 @@ class Retriever:
         Returns:
             Filtered results
         """
-        try:
-            if not date_ranges or date_ranges.get('error'):
-                return results
-            
-            parsed_ranges = date_ranges.get('parsed_ranges', {})
-            if not parsed_ranges:
-                return results
-            
-            filtered_results = []
-            
-            for result in results:
-                # Extract date from result
-                result_date = self._extract_date_from_result(result)
-                
-                if result_date is None:
-                    # If no date found, include the result (don't filter out)
-                    filtered_results.append(result)
-                    continue
-                
-                # Check if result date matches any of the date ranges
-                if self._date_matches_ranges(result_date, parsed_ranges):
-                    filtered_results.append(result)
-            
-            # If no results match date ranges, return original results
-            if not filtered_results and results:
-                print("⚠️ No results match date ranges, returning all results")
-                return results
-            
-            return filtered_results
-            
-        except Exception as e:
-            print(f"❌ Error filtering results by date ranges: {e}")
+        if not date_ranges or date_ranges.get('error'):
+            return results
+        
+        range_bounds = self._date_range_bounds(date_ranges)
+        if not range_bounds:
+            return results
+        
+        filtered_results = []
+        
+        for result in results:
+            # Extract date from result
+            result_date = self._extract_date_from_result(result)
+            
+            if result_date is None:
+                # If no date found, include the result (don't filter out)
+                filtered_results.append(result)
+                continue
+            
+            # Check if result date matches any of the date ranges
+            if self._date_matches_ranges(result_date.toordinal(), range_bounds):
+                filtered_results.append(result)
+        
+        # If no results match date ranges, return original results
+        if not filtered_results and results:
+            print("⚠️ No results match date ranges, returning all results")
             return results
+        
+        return filtered_results
     
-    def _extract_date_from_result(self, result: Dict[str, Any]) -> Optional[str]:
+    def _extract_date_from_result(self, result: Dict[str, Any]) -> Optional[date]:
         """
         Extract date from result content
         
@@ -637,113 +1097,54 @@ class Retriever:
             result: Result dictionary
             
         Returns:
-            Extracted date string or None
+            Extracted date or None
         """
-        try:
-            from datetime import datetime
-            import re
-            
-            # Try to extract date from content
-            content = result.get('content', '')
-            if not content:
-                return None
-            
-            # Look for date patterns in content
-            date_patterns = [
-                r'\d{4}-\d{2}-\d{2}',  # YYYY-MM-DD
-                r'\d{1,2}/\d{1,2}/\d{4}',  # MM/DD/YYYY
-                r'\d{1,2}-\d{1,2}-\d{4}',  # MM-DD-YYYY
-            ]
-            
-            for pattern in date_patterns:
-                match = re.search(pattern, content)
-                if match:
-                    date_str = match.group(0)
-                    # Validate date format
-                    try:
-                        if '-' in date_str and len(date_str.split('-')[0]) == 4:
-                            datetime.strptime(date_str, '%Y-%m-%d')
-                        elif '/' in date_str:
-                            datetime.strptime(date_str, '%m/%d/%Y')
-                        elif '-' in date_str and len(date_str.split('-')[0]) == 2:
-                            datetime.strptime(date_str, '%m-%d-%Y')
-                        return date_str
-                    except ValueError:
-                        continue
-            
-            # Try to extract from metadata
-            metadata = result.get('metadata', {})
-            if 'date' in metadata:
-                return str(metadata['date'])
-            
-            return None
-            
-        except Exception as e:
-            print(f"Error extracting date from result: {e}")
+        # Try to extract date from content
+        content = result.get('content', '')
+        if not content:
             return None
+        
+        # Look for date patterns in content
+        for pattern, date_format in _RESULT_DATE_PATTERNS:
+            match = pattern.search(content)
+            if match:
+                # Validate date format
+                try:
+                    return datetime.strptime(match.group(0), date_format).date()
+                except ValueError:
+                    continue
+        
+        # Try to extract from metadata
+        metadata = result.get('metadata', {})
+        if isinstance(metadata.get('date_ordinal'), int) and metadata['date_ordinal'] > 0:
+            return date.fromordinal(metadata['date_ordinal'])
+        
+        if isinstance(metadata.get('date'), str):
+            for date_format in _METADATA_DATE_FORMATS:
+                try:
+                    return datetime.strptime(metadata['date'], date_format).date()
+                except ValueError:
+                    continue
+        
+        return None
     
-    def _date_matches_ranges(self, result_date: str, parsed_ranges: Dict[str, Any]) -> bool:
+    @staticmethod
+    def _date_matches_ranges(result_ordinal: int, range_bounds: List[Tuple[int, int]]) -> bool:
         """
-        Check if result date matches any of the parsed ranges
+        Check if a result date falls in any of the date ranges
         
         Args:
-            result_date: Date string from result
-            parsed_ranges: Parsed date ranges
+            result_ordinal: Day ordinal of the result date
+            range_bounds: Inclusive (start ordinal, end ordinal) bounds
             
         Returns:
             True if date matches any range
         """
-        try:
-            from datetime import datetime
-            
-            # Parse result date
-            try:
-                if '-' in result_date and len(result_date.split('-')[0]) == 4:
-                    parsed_result_date = datetime.strptime(result_date, '%Y-%m-%d')
-                elif '/' in result_date:
-                    parsed_result_date = datetime.strptime(result_date, '%m/%d/%Y')
-                elif '-' in result_date and len(result_date.split('-')[0]) == 2:
-                    parsed_result_date = datetime.strptime(result_date, '%m-%d-%Y')
-                else:
-                    return False
-            except ValueError:
-                return False
-            
-            # Check explicit dates
-            if parsed_ranges.get('explicit'):
-                for date_info in parsed_ranges['explicit']:
-                    if parsed_result_date.date() == date_info['parsed'].date():
-                        return True
-            
-            # Check relative ranges
-            if parsed_ranges.get('relative'):
-                for range_info in parsed_ranges['relative']:
-                    start_date = range_info['start_date']
-                    end_date = range_info['end_date']
-                    if start_date.date() <= parsed_result_date.date() <= end_date.date():
-                        return True
-            
-            # Check monthly ranges
-            if parsed_ranges.get('monthly'):
-                for range_info in parsed_ranges['monthly']:
-                    start_date = range_info['start_date']
-                    end_date = range_info['end_date']
-                    if start_date.date() <= parsed_result_date.date() <= end_date.date():
-                        return True
-            
-            # Check seasonal ranges
-            if parsed_ranges.get('seasonal'):
-                for range_info in parsed_ranges['seasonal']:
-                    start_date = range_info['start_date']
-                    end_date = range_info['end_date']
-                    if start_date.date() <= parsed_result_date.date() <= end_date.date():
-                        return True
-            
-            return False
-            
-        except Exception as e:
-            print(f"Error checking date matches: {e}")
-            return False
+        for start_ordinal, end_ordinal in range_bounds:
+            if start_ordinal <= result_ordinal <= end_ordinal:
+                return True
+        
+        return False
     
     def get_retrieval_stats(self) -> Dict[str, Any]:
         """
@@ -766,4 +1167,10 @@ class Retriever:
             
         except Exception as e:
             print(f"❌ Error getting retrieval stats: {e}")
-            return {"error": str(e)} 
\ No newline at end of file
+            return {"error": str(e)} 
+    
+    def shutdown(self):
+        """Shutdown the retriever"""
+        # The shared pool outlives individual retrievers
+        if self.executor is not _RETRIEVAL_EXECUTOR:
+            self.executor.shutdown(wait=True)
@@ -5,12 +5,62 @@ Handles ChromaDB operations for storing and retrieving fitness data embeddings
 
 import os
 import json
+from datetime import datetime
 from typing import List, Dict, Any, Optional, Tuple
 import chromadb
 from chromadb.config import Settings
 from .utils.embeddings import EmbeddingManager
 
 
+# Formats of the 'date' metadata written by data preparation
+_METADATA_DATE_FORMATS = ("%d-%m-%Y", "%Y-%m-%d")
+# 'date_ordinal' of documents without a single date (trends and summaries), so
+# date range filters can still include them explicitly
+UNDATED_DATE_ORDINAL = -1
+
+
+def _date_ordinal(date_value: Any) -> Optional[int]:
+    """
+    Convert a metadata date string to a proleptic Gregorian ordinal
+    
+    Args:
+        date_value: Date from document metadata
+        
+    Returns:
+        Date ordinal, or None if the date cannot be parsed
+    """
+    if not date_value or not isinstance(date_value, str):
+        return None
+    
+    for date_format in _METADATA_DATE_FORMATS:
+        try:
+            return datetime.strptime(date_value, date_format).toordinal()
+        except ValueError:
+            continue
+    
+    return None
+
+
+def _with_date_ordinal(metadata: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Add an integer 'date_ordinal' field so queries can filter date ranges with $gte/$lte
+    
+    Args:
+        metadata: Document metadata
+        
+    Returns:
+        Metadata with 'date_ordinal' added, UNDATED_DATE_ORDINAL if it has no parseable date
+    """
+    if 'date_ordinal' in metadata:
+        return metadata
+    
+    date_ordinal = _date_ordinal(metadata.get('date'))
+    if date_ordinal is None:
+        date_ordinal = UNDATED_DATE_ORDINAL
+    
+    return {**metadata, 'date_ordinal': date_ordinal}
+
+
 class VectorStore:
     """Manages vector database operations for fitness data"""
     
@@ -28,6 +78,8 @@ class VectorStore:
         self.client = None
         self.collection = None
         self.embedding_manager = EmbeddingManager()
+        self._has_date_ordinals = None
+        self._version = 0
         self._initialize_client()
     
     def _initialize_client(self):
@@ -112,7 +164,7 @@ class VectorStore:
                     continue
                 
                 # Extract metadata
-                metadata = chunk.get('metadata', {})
+                metadata = _with_date_ordinal(chunk.get('metadata', {}))
                 
                 # Create unique ID
                 chunk_id = metadata.get('chunk_id', f"chunk_{i}")
@@ -132,6 +184,8 @@ class VectorStore:
                 ids=ids
             )
             
+            self._mark_modified()
+            
             print(f"✅ Successfully added {len(documents)} documents to vector store")
             return True
             
@@ -140,7 +194,8 @@ class VectorStore:
             return False
     
     def search(self, query: str, n_results: int = 5, 
-               filter_dict: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+               filter_dict: Optional[Dict[str, Any]] = None,
+               include_embeddings: bool = False) -> List[Dict[str, Any]]:
         """
         Search for similar documents
         
@@ -148,6 +203,7 @@ class VectorStore:
             query: Search query
             n_results: Number of results to return
             filter_dict: Optional filter criteria
+            include_embeddings: Whether to return each document's embedding
             
         Returns:
             List of search results with content, metadata, and scores
@@ -167,21 +223,11 @@ class VectorStore:
             results = self.collection.query(
                 query_texts=[query],
                 n_results=n_results,
-                where=filter_dict
+                where=filter_dict,
+                include=self._query_include(include_embeddings)
             )
             
-            # Format results
-            formatted_results = []
-            
-            if results['documents'] and results['documents'][0]:
-                for i in range(len(results['documents'][0])):
-                    result = {
-                        'content': results['documents'][0][i],
-                        'metadata': results['metadatas'][0][i] if results['metadatas'] and results['metadatas'][0] else {},
-                        'score': results['distances'][0][i] if results['distances'] and results['distances'][0] else 0.0,
-                        'id': results['ids'][0][i] if results['ids'] and results['ids'][0] else f"result_{i}"
-                    }
-                    formatted_results.append(result)
+            formatted_results = self._format_query_results(results)
             
             print(f"✅ Found {len(formatted_results)} results")
             return formatted_results
@@ -191,7 +237,8 @@ class VectorStore:
             return []
     
     def search_by_embedding(self, embedding: List[float], n_results: int = 5,
-                          filter_dict: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+                          filter_dict: Optional[Dict[str, Any]] = None,
+                          include_embeddings: bool = False) -> List[Dict[str, Any]]:
         """
         Search using a pre-computed embedding
         
@@ -199,6 +246,7 @@ class VectorStore:
             embedding: Query embedding vector
             n_results: Number of results to return
             filter_dict: Optional filter criteria
+            include_embeddings: Whether to return each document's embedding
             
         Returns:
             List of search results
@@ -216,28 +264,61 @@ class VectorStore:
             results = self.collection.query(
                 query_embeddings=[embedding],
                 n_results=n_results,
-                where=filter_dict
+                where=filter_dict,
+                include=self._query_include(include_embeddings)
             )
             
-            # Format results
-            formatted_results = []
-            
-            if results['documents'] and results['documents'][0]:
-                for i in range(len(results['documents'][0])):
-                    result = {
-                        'content': results['documents'][0][i],
-                        'metadata': results['metadatas'][0][i] if results['metadatas'] and results['metadatas'][0] else {},
-                        'score': results['distances'][0][i] if results['distances'] and results['distances'][0] else 0.0,
-                        'id': results['ids'][0][i] if results['ids'] and results['ids'][0] else f"result_{i}"
-                    }
-                    formatted_results.append(result)
-            
-            return formatted_results
+            return self._format_query_results(results)
             
         except Exception as e:
             print(f"❌ Error searching by embedding: {e}")
             return []
     
+    @staticmethod
+    def _query_include(include_embeddings: bool) -> List[str]:
+        """
+        Get the fields to request from a collection query
+        
+        Args:
+            include_embeddings: Whether to request document embeddings
+            
+        Returns:
+            List of ChromaDB include fields
+        """
+        include = ["documents", "metadatas", "distances"]
+        if include_embeddings:
+            include.append("embeddings")
+        return include
+    
+    @staticmethod
+    def _format_query_results(results: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """
+        Format a single-query ChromaDB response into result dictionaries
+        
+        Args:
+            results: Raw ChromaDB query response
+            
+        Returns:
+            List of search results, built as new dictionaries on every call
+        """
+        formatted_results = []
+        
+        if results['documents'] and results['documents'][0]:
+            embeddings = results.get('embeddings')
+            for i in range(len(results['documents'][0])):
+                result = {
+                    'content': results['documents'][0][i],
+                    'metadata': results['metadatas'][0][i] if results['metadatas'] and results['metadatas'][0] else {},
+                    'score': results['distances'][0][i] if results['distances'] and results['distances'][0] else 0.0,
+                    'id': results['ids'][0][i] if results['ids'] and results['ids'][0] else f"result_{i}"
+                }
+                # Embeddings come back as arrays, so avoid truth-testing them
+                if embeddings is not None and len(embeddings) > 0 and embeddings[0] is not None:
+                    result['embedding'] = embeddings[0][i]
+                formatted_results.append(result)
+        
+        return formatted_results
+    
     def get_collection_info(self) -> Dict[str, Any]:
         """
         Get information about the collection
@@ -266,6 +347,94 @@ class VectorStore:
             print(f"❌ Error getting collection info: {e}")
             return {"error": str(e)}
     
+    def get_document_count(self) -> int:
+        """
+        Get the number of documents in the collection
+        
+        Returns:
+            Document count (0 if the store is not initialized)
+        """
+        try:
+            if not self.collection:
+                return 0
+            
+            return self.collection.count()
+            
+        except Exception as e:
+            print(f"❌ Error counting documents: {e}")
+            return 0
+    
+    def get_all_documents(self) -> List[Dict[str, Any]]:
+        """
+        Get every document in the collection
+        
+        Returns:
+            List of documents with content, metadata, and id
+        """
+        try:
+            if not self.collection:
+                print("❌ Vector store not initialized")
+                return []
+            
+            results = self.collection.get(include=["documents", "metadatas"])
+            
+            documents = []
+            for i, doc_id in enumerate(results['ids']):
+                documents.append({
+                    'content': results['documents'][i] if results['documents'] else '',
+                    'metadata': results['metadatas'][i] if results['metadatas'] and results['metadatas'][i] else {},
+                    'id': doc_id
+                })
+            
+            return documents
+            
+        except Exception as e:
+            print(f"❌ Error getting documents: {e}")
+            return []
+    
+    def get_version(self) -> int:
+        """
+        Get a counter that changes whenever this store writes to the collection
+        
+        Returns:
+            Write version, for invalidating caches derived from stored documents
+        """
+        return self._version
+    
+    def _mark_modified(self):
+        """Record a write to the collection, dropping cached collection state"""
+        self._version += 1
+        self._has_date_ordinals = None
+    
+    def has_date_ordinals(self) -> bool:
+        """
+        Check whether every stored document carries the 'date_ordinal' metadata field
+        
+        Collections ingested before the field existed, or before undated
+        documents were marked, cannot be date-filtered in a query without
+        losing documents, so callers fall back to filtering results themselves.
+        
+        Returns:
+            True if date range filters can be pushed into queries
+        """
+        if self._has_date_ordinals is None:
+            try:
+                if not self.collection:
+                    return False
+                
+                document_count = self.collection.count()
+                results = self.collection.get(
+                    where={"date_ordinal": {"$gte": UNDATED_DATE_ORDINAL}},
+                    include=[]
+                )
+                self._has_date_ordinals = bool(document_count) and len(results['ids']) == document_count
+                
+            except Exception as e:
+                print(f"❌ Error checking date metadata: {e}")
+                return False
+        
+        return self._has_date_ordinals
+    
     def delete_collection(self) -> bool:
         """
         Delete the current collection
@@ -281,6 +450,7 @@ class VectorStore:
             # Delete collection
             self.client.delete_collection(name=self.collection_name)
             self.collection = None
+            self._mark_modified()
             
             print(f"✅ Deleted collection: {self.collection_name}")
             return True
@@ -333,9 +503,11 @@ class VectorStore:
             self.collection.update(
                 ids=[doc_id],
                 documents=[content],
-                metadatas=[metadata]
+                metadatas=[_with_date_ordinal(metadata)]
             )
             
+            self._mark_modified()
+            
             print(f"✅ Updated document: {doc_id}")
             return True
             
@@ -361,6 +533,8 @@ class VectorStore:
             # Delete document
             self.collection.delete(ids=[doc_id])
             
+            self._mark_modified()
+            
             print(f"✅ Deleted document: {doc_id}")
             return True
             
@@ -8,20 +8,25 @@ import sys
 import os
 import unittest
 import json
-from datetime import datetime, timedelta
+import re
+import threading
+import time
+from datetime import date, datetime, timedelta
 from unittest.mock import Mock, patch, MagicMock
 
 # Add the project root to the path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from rag.utils.calculations import FitnessCalculations, CalculationResult
-from rag.query_processor import QueryProcessor
+from rag.query_processor import QueryProcessor, _compile_query_pattern
 from rag.retriever import Retriever
 from rag.generator import ResponseGenerator
-from rag.vector_store import VectorStore
+from rag.vector_store import VectorStore, _with_date_ordinal
 from rag.analytics import FitnessAnalytics
 from rag.chat_interface import ChatInterface, Message, Conversation
 from rag.web_interface import WebInterface
+from rag.optimization import BatchProcessor, LoadBalancer, PerformanceMonitor
+from rag.prompts import FitnessPrompts
 
 
 class TestFitnessCalculations(unittest.TestCase):
@@ -277,6 +282,39 @@ class TestQueryProcessor(unittest.TestCase):
         self.assertIsInstance(suggestions, list)
         self.assertGreater(len(suggestions), 0)
         self.assertTrue(all("weight" in s.lower() for s in suggestions))
+    
+    def test_get_query_suggestions_short_input(self):
+        """Test query suggestions for empty or single-character input"""
+        self.assertEqual(self.query_processor.get_query_suggestions(""), [])
+        self.assertEqual(self.query_processor.get_query_suggestions(" w "), [])
+    
+    def test_classify_long_query(self):
+        """Test classification of a long query avoids catastrophic backtracking"""
+        query = "weight loss in " * 200
+        
+        self.assertEqual(self.query_processor._classify_query(query), 'calculation_request')
+    
+    def test_query_patterns_compile_without_atomic_groups(self):
+        """Test query patterns fall back to plain regexes where atomic groups are unsupported"""
+        compile_pattern = re.compile
+        
+        def compile_without_atomic_groups(pattern, flags=0):
+            if '(?>' in pattern:
+                raise re.error("unknown extension ?>")
+            return compile_pattern(pattern, flags)
+        
+        with patch('rag.query_processor.re.compile', side_effect=compile_without_atomic_groups):
+            compiled = _compile_query_pattern(r'(lose|lost).*(since|from)')
+        
+        self.assertEqual(compiled.pattern, r'(lose|lost).*(since|from)')
+        self.assertTrue(compiled.search("How much did I LOSE since january?"))
+    
+    def test_embedding_model_loaded_lazily(self):
+        """Test parsing does not load the embedding model"""
+        self.query_processor.extract_date_ranges("What was my weight in march?")
+        self.query_processor.validate_query("What is my current weight?")
+        
+        self.assertIsNone(self.query_processor._embedding_manager)
 
 
 class TestRetriever(unittest.TestCase):
@@ -295,8 +333,8 @@ class TestRetriever(unittest.TestCase):
             'metadata': {'date': '2024-02-15'}
         }
         
-        date = self.retriever._extract_date_from_result(result)
-        self.assertEqual(date, '2024-02-15')
+        result_date = self.retriever._extract_date_from_result(result)
+        self.assertEqual(result_date, date(2024, 2, 15))
     
     def test_extract_date_from_result_no_date(self):
         """Test date extraction from result with no date"""
@@ -305,12 +343,12 @@ class TestRetriever(unittest.TestCase):
             'metadata': {}
         }
         
-        date = self.retriever._extract_date_from_result(result)
-        self.assertIsNone(date)
+        result_date = self.retriever._extract_date_from_result(result)
+        self.assertIsNone(result_date)
     
     def test_date_matches_ranges_explicit(self):
         """Test date matching with explicit dates"""
-        result_date = '2024-02-15'
+        result_date = date(2024, 2, 15)
         parsed_ranges = {
             'explicit': [
                 {'parsed': datetime(2024, 2, 15)},
@@ -318,12 +356,13 @@ class TestRetriever(unittest.TestCase):
             ]
         }
         
-        matches = self.retriever._date_matches_ranges(result_date, parsed_ranges)
+        range_bounds = self.retriever._date_range_bounds({'parsed_ranges': parsed_ranges})
+        matches = self.retriever._date_matches_ranges(result_date.toordinal(), range_bounds)
         self.assertTrue(matches)
     
     def test_date_matches_ranges_relative(self):
         """Test date matching with relative ranges"""
-        result_date = '2024-02-15'
+        result_date = date(2024, 2, 15)
         parsed_ranges = {
             'relative': [
                 {
@@ -333,12 +372,13 @@ class TestRetriever(unittest.TestCase):
             ]
         }
         
-        matches = self.retriever._date_matches_ranges(result_date, parsed_ranges)
+        range_bounds = self.retriever._date_range_bounds({'parsed_ranges': parsed_ranges})
+        matches = self.retriever._date_matches_ranges(result_date.toordinal(), range_bounds)
         self.assertTrue(matches)
     
     def test_date_matches_ranges_no_match(self):
         """Test date matching with no match"""
-        result_date = '2024-05-15'
+        result_date = date(2024, 5, 15)
         parsed_ranges = {
             'relative': [
                 {
@@ -348,7 +388,8 @@ class TestRetriever(unittest.TestCase):
             ]
         }
         
-        matches = self.retriever._date_matches_ranges(result_date, parsed_ranges)
+        range_bounds = self.retriever._date_range_bounds({'parsed_ranges': parsed_ranges})
+        matches = self.retriever._date_matches_ranges(result_date.toordinal(), range_bounds)
         self.assertFalse(matches)
     
     def test_build_enhanced_filters(self):
@@ -373,7 +414,79 @@ class TestRetriever(unittest.TestCase):
         
         self.assertIn('date_filters', enhanced_filters)
         self.assertEqual(enhanced_filters['query_type'], 'time_range_analysis')
-    
+
+    def test_build_enhanced_filters_date_ordinal(self):
+        """Test a single date range is pushed into the vector store filter"""
+        self.vector_store.has_date_ordinals.return_value = True
+        date_ranges = {
+            'parsed_ranges': {
+                'relative': [
+                    {
+                        'start_date': datetime(2024, 2, 1),
+                        'end_date': datetime(2024, 2, 29),
+                        'range_name': 'this_month'
+                    }
+                ]
+            }
+        }
+
+        filter_criteria = {'type': 'measurement'}
+
+        enhanced_filters = self.retriever._build_enhanced_filters(filter_criteria, date_ranges, {})
+
+        self.assertEqual(enhanced_filters['date_ordinal'], {
+            '$gte': datetime(2024, 2, 1).toordinal(),
+            '$lte': datetime(2024, 2, 29).toordinal()
+        })
+        # The caller's filter is shared with hybrid search's keyword branch
+        self.assertEqual(filter_criteria, {'type': 'measurement'})
+    
+    def _fake_store_search(self, documents):
+        """Serve documents from the mock store, applying where clauses as ChromaDB would"""
+        self.query_processor._embedding_manager = Mock(provider="sentence-transformers")
+        self.query_processor._embedding_manager.get_embeddings.side_effect = (
+            lambda queries: [[1.0, 0.0] for _ in queries]
+        )
+        self.vector_store.get_document_count.return_value = len(documents)
+        self.vector_store.get_version.return_value = 0
+        self.vector_store.has_date_ordinals.return_value = True
+        self.vector_store.search.side_effect = lambda query, n_results, filter_dict, **kwargs: [
+            dict(document, metadata=_with_date_ordinal(document['metadata']))
+            for document in documents
+            if Retriever._matches_metadata_filter(_with_date_ordinal(document['metadata']), filter_dict)
+        ][:n_results]
+
+    def test_store_date_filter_keeps_undated_documents(self):
+        """Test pushing a date range into the store still returns undated summaries"""
+        self._fake_store_search([
+            {'id': 'in_range', 'content': 'Weight 91.0 kg', 'score': 0.5,
+             'metadata': {'type': 'measurement', 'date': '15-02-2024'}},
+            {'id': 'out_of_range', 'content': 'Weight 95.0 kg', 'score': 0.5,
+             'metadata': {'type': 'measurement', 'date': '15-01-2024'}},
+            {'id': 'summary', 'content': 'Fitness data summary', 'score': 0.5,
+             'metadata': {'type': 'overall_summary', 'date_range': '2024-01-01 to 2024-03-26'}}
+        ])
+
+        results = self.retriever.retrieve('weight on 2024-02-15', use_enhanced_queries=False)
+
+        self.assertEqual(sorted(r['id'] for r in results), ['in_range', 'summary'])
+
+    def test_store_date_filter_fallback_keeps_other_filters(self):
+        """Test an empty date-filtered search is retried without only the date filter"""
+        self._fake_store_search([
+            {'id': 'january', 'content': 'Weight 95.0 kg', 'score': 0.5,
+             'metadata': {'type': 'measurement', 'date': '15-01-2024'}},
+            {'id': 'summary', 'content': 'Fitness data summary', 'score': 0.5,
+             'metadata': {'type': 'overall_summary'}}
+        ])
+
+        results = self.retriever.retrieve(
+            'weight on 2024-02-15', filter_criteria={'type': 'measurement'}, use_enhanced_queries=False
+        )
+
+        self.assertEqual([r['id'] for r in results], ['january'])
+        self.assertEqual(self.vector_store.search.call_args.kwargs['filter_dict'], {'type': 'measurement'})
+
     def test_filter_results_by_date_ranges(self):
         """Test result filtering by date ranges"""
         results = [
@@ -406,6 +519,192 @@ class TestRetriever(unittest.TestCase):
         
         self.assertEqual(len(filtered_results), 1)
         self.assertIn('2024-02-15', filtered_results[0]['content'])
+    
+    def test_enhanced_queries_embedded_in_one_batch(self):
+        """Test enhanced queries are embedded once and searched by embedding"""
+        self.query_processor._embedding_manager = Mock(provider="sentence-transformers")
+        self.query_processor._embedding_manager.get_embeddings.return_value = [[0.1, 0.2], [0.3, 0.4]]
+        self.vector_store.search_by_embedding.side_effect = [
+            [{'id': 'a', 'content': 'Week 1 weight', 'score': 0.9}],
+            [{'id': 'b', 'content': 'Week 2 weight', 'score': 0.8}]
+        ]
+        
+        results = self.retriever._retrieve_with_enhanced_queries(
+            {'enhanced_queries': ['weight trend', 'weight changes']}, 3, None
+        )
+        
+        self.query_processor._embedding_manager.get_embeddings.assert_called_once_with(
+            ['weight trend', 'weight changes']
+        )
+        self.assertEqual(self.vector_store.search_by_embedding.call_count, 2)
+        self.vector_store.search.assert_not_called()
+        self.assertEqual([r['id'] for r in results], ['a', 'b'])
+    
+    def test_enhanced_query_embeddings_cached(self):
+        """Test repeated enhanced queries reuse cached embeddings"""
+        self.query_processor._embedding_manager = Mock(provider="sentence-transformers")
+        self.query_processor._embedding_manager.get_embeddings.return_value = [[0.1, 0.2]]
+        self.vector_store.search_by_embedding.return_value = []
+        
+        for _ in range(2):
+            self.retriever._retrieve_with_enhanced_queries(
+                {'enhanced_queries': ['weight trend']}, 3, None
+            )
+        
+        self.query_processor._embedding_manager.get_embeddings.assert_called_once_with(['weight trend'])
+        self.assertEqual(self.vector_store.search_by_embedding.call_count, 2)
+
+    def test_deduplicate_results_by_embedding(self):
+        """Test near-duplicate results are dropped only when their dates match"""
+        results = [
+            {'id': 'a', 'content': 'Week 1  weight 91.0', 'embedding': [1.0, 0.0],
+             'metadata': {'date': '01-01-2024'}},
+            {'id': 'b', 'content': 'Week 1 weight 91.0', 'embedding': [0.99, 0.01],
+             'metadata': {'date': '01-01-2024'}},
+            {'id': 'c', 'content': 'Week 2 weight 90.5', 'embedding': [0.99, 0.02],
+             'metadata': {'date': '08-01-2024'}},
+            {'id': 'a', 'content': 'Week 1  weight 91.0', 'embedding': [1.0, 0.0],
+             'metadata': {'date': '01-01-2024'}}
+        ]
+
+        unique_results = self.retriever._deduplicate_results(results)
+
+        # Templated weeks embed alike, so week 2 must survive despite its similarity
+        self.assertEqual([r['id'] for r in unique_results], ['a', 'c'])
+        self.assertNotIn('embedding', unique_results[0])
+
+    def test_enhanced_query_results_merged_across_searches(self):
+        """Test enhanced-query results are deduplicated across searches and capped"""
+        self.query_processor._embedding_manager = Mock(provider="sentence-transformers")
+        self.query_processor._embedding_manager.get_embeddings.return_value = [[0.1, 0.2], [0.3, 0.4]]
+        search_results = {
+            0.1: [
+                {'id': 'a', 'content': 'Week 1 weight', 'score': 0.5, 'embedding': [1.0, 0.0],
+                 'metadata': {'date': '01-01-2024'}},
+                {'id': 'b', 'content': 'Week 2 weight', 'score': 0.7, 'embedding': [0.0, 1.0],
+                 'metadata': {'date': '08-01-2024'}}
+            ],
+            0.3: [
+                {'id': 'c', 'content': 'Week 1  weight', 'score': 0.9, 'embedding': [0.99, 0.01],
+                 'metadata': {'date': '01-01-2024'}},
+                {'id': 'd', 'content': 'Week 3 weight', 'score': 0.6, 'embedding': [0.6, 0.8],
+                 'metadata': {'date': '15-01-2024'}}
+            ]
+        }
+        # Searches run concurrently, so answer by embedding rather than call order
+        self.vector_store.search_by_embedding.side_effect = (
+            lambda embedding, *args, **kwargs: search_results[embedding[0]]
+        )
+
+        results = self.retriever._retrieve_with_enhanced_queries(
+            {'enhanced_queries': ['weight trend', 'weight changes']}, 2, None
+        )
+
+        self.assertEqual([r['id'] for r in results], ['b', 'd'])
+
+    def test_keyword_search_bm25(self):
+        """Test keyword search ranks documents by BM25 instead of re-running retrieval"""
+        self.vector_store.get_document_count.return_value = 4
+        self.vector_store.get_all_documents.return_value = [
+            {'id': 'a', 'content': 'Week 1 weight 91.0 kg', 'metadata': {}},
+            {'id': 'b', 'content': 'Week 2 waist 80 inches', 'metadata': {}},
+            {'id': 'c', 'content': 'Week 3 hips 100 inches', 'metadata': {}},
+            {'id': 'd', 'content': 'Week 4 chest 105 inches', 'metadata': {}}
+        ]
+
+        results = self.retriever._keyword_search('waist measurement', 3, None)
+
+        self.assertEqual([r['id'] for r in results], ['b'])
+        self.assertEqual(results[0]['score'], 1.0)
+        self.vector_store.search.assert_not_called()
+
+    def test_keyword_search_filters_like_semantic_search(self):
+        """Test keyword search applies operator filters and query dates, and reindexes on writes"""
+        self.vector_store.get_document_count.return_value = 5
+        self.vector_store.get_version.return_value = 0
+        self.vector_store.get_all_documents.return_value = [
+            {'id': 'a', 'content': 'Weight 91.0 kg', 'metadata': {'type': 'measurement', 'date': '15-02-2024'}},
+            {'id': 'b', 'content': 'Weight 90.5 kg', 'metadata': {'type': 'measurement', 'date': '22-02-2024'}},
+            {'id': 'c', 'content': 'Weight trend', 'metadata': {'type': 'trend'}},
+            {'id': 'd', 'content': 'Waist 80 inches', 'metadata': {'type': 'measurement', 'date': '15-02-2024'}},
+            {'id': 'e', 'content': 'Hips 100 inches', 'metadata': {'type': 'measurement', 'date': '15-02-2024'}}
+        ]
+
+        results = self.retriever._keyword_search(
+            'weight on 2024-02-15', 3, {'type': {'$in': ['measurement', 'trend']}}
+        )
+        self.assertEqual(sorted(r['id'] for r in results), ['a', 'c'])
+
+        results = self.retriever._keyword_search('weight', 3, {'type': {'$ne': 'trend'}})
+        self.assertEqual(sorted(r['id'] for r in results), ['a', 'b'])
+
+        # An update keeps the document count but must still reach the index
+        self.vector_store.get_version.return_value = 1
+        self.retriever._keyword_search('weight', 3, None)
+        self.assertEqual(self.vector_store.get_all_documents.call_count, 2)
+
+    def test_combine_search_results(self):
+        """Test semantic and keyword scores are fused per document"""
+        semantic_results = [{'id': 'a', 'score': 0.5}, {'id': 'b', 'score': 0.9}, {'id': 'a', 'score': 0.7}]
+        keyword_results = [{'id': 'c', 'score': 1.0}, {'id': 'a', 'score': 0.2}]
+
+        combined = self.retriever._combine_search_results(semantic_results, keyword_results, 0.7)
+
+        self.assertEqual([r['id'] for r in combined], ['b', 'a', 'c'])
+        self.assertAlmostEqual(combined[1]['combined_score'], 0.7 * 0.7 + 0.3 * 0.2)
+        self.assertEqual(combined[1]['semantic_score'], 0.7)
+        self.assertEqual(combined[2]['semantic_score'], 0.0)
+        # Semantic results may be cached, so they are left untouched
+        self.assertNotIn('combined_score', semantic_results[1])
+
+    def test_retrieve_semantic_cache(self):
+        """Test a near-identical repeat query is served from the semantic cache"""
+        embeddings = {'weight trend': [1.0, 0.0], 'weight trends': [0.99, 0.02], 'waist size': [0.0, 1.0]}
+        self.query_processor._embedding_manager = Mock(provider="sentence-transformers")
+        self.query_processor._embedding_manager.get_embeddings.side_effect = (
+            lambda queries: [embeddings[query] for query in queries]
+        )
+        self.vector_store.get_document_count.return_value = 1
+        self.vector_store.get_version.return_value = 0
+        self.vector_store.search.return_value = [
+            {'id': 'a', 'content': 'Week 1 weight 91.0', 'score': 0.5, 'metadata': {}}
+        ]
+
+        first = self.retriever.retrieve('weight trend', use_enhanced_queries=False)
+        second = self.retriever.retrieve('weight trends', use_enhanced_queries=False)
+        self.assertEqual(self.vector_store.search.call_count, 1)
+        self.assertEqual(first, second)
+
+        self.retriever.retrieve('waist size', use_enhanced_queries=False)
+        self.assertEqual(self.vector_store.search.call_count, 2)
+
+        # Any write to the store, even one keeping the document count, invalidates the cache
+        self.vector_store.get_version.return_value = 1
+        self.retriever.retrieve('weight trend', use_enhanced_queries=False)
+        self.assertEqual(self.vector_store.search.call_count, 3)
+
+    def test_retrieve_semantic_cache_entities_and_copies(self):
+        """Test the semantic cache misses on different entities and hands out copies"""
+        embeddings = {'weight trend': [1.0, 0.0], 'waist trend': [0.99, 0.02]}
+        self.query_processor._embedding_manager = Mock(provider="sentence-transformers")
+        self.query_processor._embedding_manager.get_embeddings.side_effect = (
+            lambda queries: [embeddings[query] for query in queries]
+        )
+        self.vector_store.get_document_count.return_value = 1
+        self.vector_store.get_version.return_value = 0
+        self.vector_store.search.side_effect = lambda *args, **kwargs: [
+            {'id': 'a', 'content': 'Week 1 weight 91.0', 'score': 0.5, 'metadata': {}}
+        ]
+
+        first = self.retriever.retrieve('weight trend', use_enhanced_queries=False)
+        first[0]['metadata']['note'] = 'mutated by caller'
+        second = self.retriever.retrieve('weight trend', use_enhanced_queries=False)
+        self.assertEqual(self.vector_store.search.call_count, 1)
+        self.assertNotIn('note', second[0]['metadata'])
+
+        # Close embeddings but a different measurement must not share cached results
+        self.retriever.retrieve('waist trend', use_enhanced_queries=False)
+        self.assertEqual(self.vector_store.search.call_count, 2)
 
 
 class TestResponseGenerator(unittest.TestCase):
@@ -845,6 +1144,253 @@ class TestIntegration(unittest.TestCase):
         self.assertIn('Unusually large weight loss detected', impossible_loss.warnings[0])
 
 
+class TestFitnessPrompts(unittest.TestCase):
+    """Unit tests for FitnessPrompts class"""
+    
+    def setUp(self):
+        """Set up test data"""
+        self.prompts = FitnessPrompts()
+        self.context = [
+            {'content': 'Weight: 100.0 kg', 'metadata': {'date': '2025-01-01'}, 'relevance_score': 0.8},
+            {'content': 'Weight: 95.0 kg', 'metadata': {'date': '2025-03-01'}, 'relevance_score': 0.9}
+        ]
+    
+    def test_prompt_prefix_shared_by_query_type(self):
+        """Test prompts of the same type start with the same prefix"""
+        prefix = self.prompts.get_prompt_prefix('trend')
+        
+        for query in ['How is my weight trending?', 'Is my body fat going down?']:
+            prompt = self.prompts.get_prompt_for_query('trend', self.context, query)
+            self.assertTrue(prompt.startswith(prefix + query))
+    
+    def test_get_specific_prompt(self):
+        """Test specific prompt includes the latest data without analytics"""
+        prompt = self.prompts.get_specific_prompt('What is my current weight?', self.context, top_k=1)
+        
+        self.assertIn('**User Query**: What is my current weight?', prompt)
+        self.assertIn('Weight: 95.0 kg', prompt)
+        self.assertNotIn('Weight: 100.0 kg', prompt)
+        self.assertNotIn('Analytics', prompt)
+    
+    def test_get_batch_prompt(self):
+        """Test batch prompt numbers every query"""
+        prompt = self.prompts.get_batch_prompt(
+            [('specific', 'What is my current weight?'), ('trend', 'How is my weight trending?')],
+            self.context
+        )
+        
+        self.assertIn('[1] (type=specific) What is my current weight?', prompt)
+        self.assertIn('[2] (type=trend) How is my weight trending?', prompt)
+        self.assertIn('Weight: 95.0 kg', prompt)
+    
+    def test_parse_batch_response(self):
+        """Test batch response is split per question"""
+        answers = self.prompts.parse_batch_response(
+            "[1] Your current weight is 95.0 kg as of 2025-03-01.\n[2] Your weight is decreasing."
+        )
+        
+        self.assertEqual(answers[1], 'Your current weight is 95.0 kg as of 2025-03-01.')
+        self.assertEqual(answers[2], 'Your weight is decreasing.')
+    
+    def test_format_context_top_k(self):
+        """Test top_k keeps only the most recent documents"""
+        context_text = self.prompts._format_context(self.context, top_k=1)
+        
+        self.assertIn('Weight: 95.0 kg', context_text)
+        self.assertNotIn('Weight: 100.0 kg', context_text)
+    
+    def test_format_context_max_tokens(self):
+        """Test token budget always keeps the most recent document"""
+        context_text = self.prompts._format_context(self.context, max_tokens=1)
+        
+        self.assertIn('Weight: 95.0 kg', context_text)
+        self.assertNotIn('Weight: 100.0 kg', context_text)
+    
+    def test_format_context_cache_keyed_on_content(self):
+        """Test a context list edited in place is reformatted instead of served stale"""
+        context = [dict(doc) for doc in self.context]
+        self.prompts._format_context(context)
+        
+        context[1] = dict(context[1], content='Weight: 93.0 kg')
+        context_text = self.prompts._format_context(context)
+        
+        self.assertIn('Weight: 93.0 kg', context_text)
+        self.assertNotIn('Weight: 95.0 kg', context_text)
+    
+    def test_format_context_cache_thread_safe(self):
+        """Test concurrent formatting through one shared instance"""
+        errors = []
+        
+        def format_many(offset):
+            for i in range(200):
+                context = [{'id': f'doc_{offset}_{i}', 'content': f'Weight: {i}.0 kg',
+                            'metadata': {'date': '2025-03-01'}}]
+                if f'Weight: {i}.0 kg' not in self.prompts._format_context(context):
+                    errors.append(i)
+        
+        threads = [threading.Thread(target=format_many, args=(offset,)) for offset in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        self.assertEqual(errors, [])
+        self.assertLessEqual(len(self.prompts._context_cache), self.prompts._context_cache_size)
+
+
+class TestOptimization(unittest.TestCase):
+    """Unit tests for optimization components"""
+    
+    def _wait_for_job(self, batch_processor, job_id, timeout=5.0):
+        """Poll a batch job until it finishes, returning its final status"""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            status = batch_processor.get_job_status(job_id)
+            if status and status['status'] in BatchProcessor.FINISHED_STATUSES:
+                return status
+            time.sleep(0.005)
+        self.fail(f"Batch job {job_id} did not finish")
+    
+    def test_performance_monitor_buffers_until_full(self):
+        """Test metrics stay in the thread buffer until buffer_size is reached"""
+        monitor = PerformanceMonitor(buffer_size=4, flush_interval=60)
+        
+        for i in range(3):
+            monitor.record_metric('op', float(i), True)
+        self.assertEqual(len(monitor.metrics), 0)
+        
+        monitor.record_metric('op', 3.0, True)
+        self.assertEqual([m.duration_ms for m in monitor.metrics], [0.0, 1.0, 2.0, 3.0])
+    
+    def test_performance_monitor_flush(self):
+        """Test flush moves buffered metrics into shared storage"""
+        monitor = PerformanceMonitor(buffer_size=64, flush_interval=60)
+        monitor.record_metric('op', 1.0, True)
+        monitor.record_metric('op', 2.0, False)
+        
+        monitor.flush()
+        self.assertEqual([m.duration_ms for m in monitor.metrics], [1.0, 2.0])
+    
+    def test_performance_monitor_flushes_stale_buffer(self):
+        """Test a buffered metric older than flush_interval is flushed on the next record"""
+        monitor = PerformanceMonitor(buffer_size=64, flush_interval=0)
+        monitor.record_metric('op', 1.0, True)
+        monitor.record_metric('op', 2.0, True)
+        self.assertEqual(len(monitor.metrics), 2)
+    
+    def test_performance_monitor_reads_other_threads_buffers(self):
+        """Test get_metrics drains other threads' buffers and drops those of finished threads"""
+        monitor = PerformanceMonitor(buffer_size=64, flush_interval=60)
+        
+        def record(operation):
+            monitor.record_metric(operation, 5.0, True)
+        
+        threads = [threading.Thread(target=record, args=(f'op_{i}',)) for i in range(8)]
+        for thread in threads:
+            thread.start()
+            thread.join()
+        
+        metrics = monitor.get_metrics()
+        self.assertEqual(sorted(m.operation for m in metrics), [f'op_{i}' for i in range(8)])
+        self.assertEqual(len(monitor.get_metrics(operation='op_3')), 1)
+        self.assertEqual(monitor._buffers, [])
+    
+    def test_batch_processor_limits_concurrent_chunks(self):
+        """Test max_workers bounds how many chunks run at once on the shared pool"""
+        batch_processor = BatchProcessor(max_workers=2)
+        lock = threading.Lock()
+        running = [0]
+        peak = [0]
+        
+        def slow_double(item):
+            with lock:
+                running[0] += 1
+                peak[0] = max(peak[0], running[0])
+            time.sleep(0.01)
+            with lock:
+                running[0] -= 1
+            return item * 2
+        
+        job_id = batch_processor.submit_batch(list(range(16)), slow_double)
+        self._wait_for_job(batch_processor, job_id)
+        
+        self.assertEqual(batch_processor.get_job_results(job_id), [item * 2 for item in range(16)])
+        self.assertLessEqual(peak[0], 2)
+    
+    def test_batch_processor_results_in_item_order(self):
+        """Test batch results come back in item order however chunks finish"""
+        batch_processor = BatchProcessor(max_workers=4)
+        
+        def jittered_square(item):
+            time.sleep(0.001 * (item % 3))
+            return item * item
+        
+        job_id = batch_processor.submit_batch(list(range(50)), jittered_square)
+        status = self._wait_for_job(batch_processor, job_id)
+        
+        self.assertEqual(status['status'], 'completed')
+        self.assertEqual(status['completed_items'], 50)
+        self.assertEqual(batch_processor.get_job_results(job_id), [item * item for item in range(50)])
+    
+    def test_batch_processor_empty_items(self):
+        """Test an empty batch completes immediately"""
+        batch_processor = BatchProcessor()
+        
+        job_id = batch_processor.submit_batch([], lambda item: item)
+        
+        self.assertEqual(batch_processor.get_job_status(job_id)['status'], 'completed')
+        self.assertEqual(batch_processor.get_job_results(job_id), [])
+    
+    def test_batch_processor_records_item_errors(self):
+        """Test failing items yield None results and are recorded as job errors"""
+        batch_processor = BatchProcessor(max_workers=1)
+        
+        job_id = batch_processor.submit_batch([1, 0, 2], lambda item: 10 // item)
+        status = self._wait_for_job(batch_processor, job_id)
+        
+        self.assertEqual(status['status'], 'failed')
+        self.assertEqual(status['error_count'], 1)
+        self.assertIn('division', status['errors'][0])
+        self.assertEqual(batch_processor.get_job_results(job_id), [10, None, 5])
+    
+    def test_batch_processor_evicts_oldest_finished_jobs(self):
+        """Test finished jobs beyond the retention cap are evicted oldest first"""
+        batch_processor = BatchProcessor(max_completed_jobs=BatchProcessor.NUM_SHARDS)
+        
+        # Empty jobs finish on submission; a frozen clock makes submission order break the ties
+        with patch('rag.optimization.datetime') as mock_datetime:
+            mock_datetime.now.return_value = datetime(2024, 1, 1)
+            job_ids = [batch_processor.submit_batch([], lambda item: item) for _ in range(64)]
+        
+        # The cap is per shard, so each shard keeps only its newest job
+        newest_per_shard = {}
+        for job_id in job_ids:
+            newest_per_shard[id(batch_processor._shard(job_id))] = job_id
+        self.assertEqual(set(batch_processor.completed_jobs), set(newest_per_shard.values()))
+    
+    def test_load_balancer_returns_result(self):
+        """Test load balancer returns the operation result"""
+        load_balancer = LoadBalancer(max_concurrent_requests=2)
+        try:
+            self.assertEqual(load_balancer.submit_request(lambda x: x * 2, 21), 42)
+            self.assertEqual(load_balancer.get_load_statistics()['active_requests'], 0)
+        finally:
+            load_balancer.shutdown()
+    
+    def test_load_balancer_propagates_errors(self):
+        """Test load balancer re-raises operation errors"""
+        load_balancer = LoadBalancer(max_concurrent_requests=1)
+        
+        def failing_operation():
+            raise ValueError("boom")
+        
+        try:
+            with self.assertRaises(ValueError):
+                load_balancer.submit_request(failing_operation)
+        finally:
+            load_balancer.shutdown()
+
+
 def run_comprehensive_tests():
     """Run all comprehensive tests"""
     # Create test suite
@@ -857,6 +1403,8 @@ def run_comprehensive_tests():
     test_suite.addTest(unittest.TestLoader().loadTestsFromTestCase(TestResponseGenerator))
     test_suite.addTest(unittest.TestLoader().loadTestsFromTestCase(TestChatInterface))
     test_suite.addTest(unittest.TestLoader().loadTestsFromTestCase(TestWebInterface))
+    test_suite.addTest(unittest.TestLoader().loadTestsFromTestCase(TestFitnessPrompts))
+    test_suite.addTest(unittest.TestLoader().loadTestsFromTestCase(TestOptimization))
     
     # Add integration tests
     test_suite.addTest(unittest.TestLoader().loadTestsFromTestCase(TestIntegration))